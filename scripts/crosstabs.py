@@ -1,5 +1,14 @@
 import pandas as pd
 import numpy as np
+import os
+import json
+import pickle
+import hashlib
+from dataclasses import dataclass, field
+from statistics import NormalDist
+
+# Multi-response cell values that do not count as a mention (same words as quant_analyzer.FALSY_VALUES)
+UNCHECKED_VALUES = {"", "nan", "none", "0", "false", "no", "não"}
 
 def weighted_crosstab(df, index_col, columns_col, weight_col='weight', normalize=True):
     """
@@ -35,7 +44,488 @@ def weighted_crosstab(df, index_col, columns_col, weight_col='weight', normalize
         
     return ct
 
-def run_automated_crosstabs(df, target_cols, banner_cols, weight_col='weight', output_dir='output'):
+def crosstab_standard_errors(df, index_col, columns_col, replicates, weight_col='weight', normalize=True):
+    """
+    Replicate-based standard errors for the percentages of `weighted_crosstab`.
+
+    Weighted cell totals for the full sample and every replicate come from one
+    sparse cell-indicator x replicate-weight matrix product.
+
+    Args:
+        df: DataFrame
+        index_col: Column for rows
+        columns_col: Column for columns
+        replicates: ReplicateWeights from weighting.replicate_weights (needs .weights and .scale).
+        weight_col: Column containing full-sample weights
+        normalize: 'index' (row %), 'columns' (col %) or True/'all'.
+
+    Returns:
+        DataFrame of standard errors in percentage points, shaped like the crosstab.
+    """
+    from scipy import sparse
+
+    weights = df[weight_col].fillna(0).to_numpy(dtype=float) if weight_col in df.columns else np.ones(len(df))
+    row_codes, row_labels = pd.factorize(df[index_col], sort=True)
+    col_codes, col_labels = pd.factorize(df[columns_col], sort=True)
+    valid = (row_codes >= 0) & (col_codes >= 0)
+    n_rows, n_cols = len(row_labels), len(col_labels)
+
+    cells = row_codes[valid] * n_cols + col_codes[valid]
+    indicator = sparse.csr_matrix(
+        (np.ones(len(cells)), (cells, np.flatnonzero(valid))), shape=(n_rows * n_cols, len(df))
+    )
+    W = np.column_stack([weights, replicates.weights])
+    totals = np.asarray(indicator @ W).reshape(n_rows, n_cols, -1)
+
+    if normalize == 'index':
+        base = totals.sum(axis=1, keepdims=True)
+    elif normalize == 'columns':
+        base = totals.sum(axis=0, keepdims=True)
+    else:
+        base = totals.sum(axis=(0, 1), keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pcts = totals / base * 100
+
+    deviations = pcts[:, :, 1:] - pcts[:, :, :1]
+    se = np.sqrt(replicates.scale * np.nansum(deviations ** 2, axis=2))
+    # An undefined full-sample percentage has no standard error (not zero)
+    se = np.where(np.isnan(pcts[:, :, 0]), np.nan, se)
+    return pd.DataFrame(se, index=pd.Index(row_labels, name=index_col), columns=pd.Index(col_labels, name=columns_col))
+
+@dataclass
+class BannerBook:
+    """
+    Weighted count tables of every target against all banner columns side by side.
+
+    `banners` lists (banner_name, category_labels), starting with ('Total', ['Total']).
+    `tables[target]` holds 'labels' (row labels), 'is_net' (per row), 'counts'
+    (weighted), 'n' (unweighted) and 'sq' (sum of squared weights) arrays of shape
+    (n_rows, n_banner_columns), plus the column bases 'base', 'base_n' and 'base_sq'.
+    Rows of multi-response targets and nets overlap, so bases are stored rather
+    than summed from the rows. 'sorted_labels' is True when the category rows come
+    from a sorted factorize (single-response) and False when their order is given
+    (multi-response member columns).
+    """
+    banners: list
+    tables: dict = field(default_factory=dict)
+
+    def columns(self):
+        """MultiIndex of (banner, category) for the side-by-side banner columns."""
+        return pd.MultiIndex.from_tuples(
+            [(name, label) for name, labels in self.banners for label in labels], names=['banner', 'category']
+        )
+
+    def letters(self):
+        """Significance letter of each banner column (A, B, ... Z, AA, ...); '' for Total."""
+        letters = []
+        tested = 0
+        for name, labels in self.banners:
+            for _ in labels:
+                if name == 'Total':
+                    letters.append('')
+                    continue
+                i, letter = tested, ''
+                while i >= 0:
+                    letter = chr(ord('A') + i % 26) + letter
+                    i = i // 26 - 1
+                letters.append(letter)
+                tested += 1
+        return letters
+
+    def significance(self, target, alpha=0.05, min_base=30):
+        """
+        Column-proportion z-tests between every pair of columns of the same banner.
+
+        Each cell lists the letters of the columns it is significantly higher than
+        (two-sided test at `alpha`). Bases are Kish effective bases, (sum w)^2 / sum w^2,
+        so weighting is reflected; columns with an effective base below `min_base`
+        are not tested.
+
+        Returns:
+            DataFrame of letter strings shaped like `table(target)`.
+        """
+        t = self.tables[target]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            p = t['counts'] / t['base']
+            n_eff = t['base'] ** 2 / t['base_sq']
+
+        group = np.repeat(np.arange(len(self.banners)), [len(labels) for _, labels in self.banners])
+        testable = (n_eff >= min_base) & (group > 0)
+        pairs = (group[:, None] == group[None, :]) & testable[:, None] & testable[None, :]
+
+        # z[k, i, j] > 0 when column i is higher than column j for category k
+        p_i, p_j = p[:, :, None], p[:, None, :]
+        n_i, n_j = n_eff[None, :, None], n_eff[None, None, :]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            pooled = (p_i * n_i + p_j * n_j) / (n_i + n_j)
+            z = (p_i - p_j) / np.sqrt(pooled * (1 - pooled) * (1 / n_i + 1 / n_j))
+        significant = (z > NormalDist().inv_cdf(1 - alpha / 2)) & pairs[None, :, :]
+
+        letters = np.array(self.letters(), dtype=object)
+        sig = np.array([[''.join(letters[row]) for row in cell] for cell in significant], dtype=object)
+        return pd.DataFrame(sig.reshape(p.shape), index=pd.Index(t['labels'], name=target), columns=self.columns())
+
+    def table(self, target, values='pct'):
+        """One target's banner table: 'pct' (column %), 'counts' (weighted) or 'n' (unweighted)."""
+        t = self.tables[target]
+        data = t['counts'] if values != 'n' else t['n']
+        if values == 'pct':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                data = data / t['base'] * 100
+        return pd.DataFrame(data, index=pd.Index(t['labels'], name=target), columns=self.columns())
+
+    def to_long(self, alpha=0.05, min_base=30):
+        """All tables in long format: target, target_category, is_net, banner, banner_category, letter, count, n, base, pct, sig."""
+        frames = []
+        cols = self.columns()
+        letters = np.array(self.letters(), dtype=object)
+        for target, t in self.tables.items():
+            n_categories, n_columns = t['counts'].shape
+            base = t['base']
+            with np.errstate(invalid='ignore', divide='ignore'):
+                pct = t['counts'] / base * 100
+            frames.append(pd.DataFrame({
+                'target': target,
+                'target_category': np.repeat(np.asarray(t['labels'], dtype=object), n_columns),
+                'is_net': np.repeat(t['is_net'], n_columns),
+                'banner': np.tile(cols.get_level_values(0).to_numpy(dtype=object), n_categories),
+                'banner_category': np.tile(cols.get_level_values(1).to_numpy(dtype=object), n_categories),
+                'letter': np.tile(letters, n_categories),
+                'count': t['counts'].ravel(),
+                'n': t['n'].ravel(),
+                'base': np.tile(base, n_categories),
+                'pct': pct.ravel(),
+                'sig': self.significance(target, alpha, min_base).to_numpy().ravel(),
+            }))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def is_checked(val):
+    """Whether one multi-response cell counts as a mention (not missing, empty, 0/False or a "no" word)."""
+    if pd.isna(val) or val is False:
+        return False
+    if isinstance(val, (int, float, np.number)) and not isinstance(val, bool):
+        return val != 0
+    return str(val).strip().lower() not in UNCHECKED_VALUES
+
+def checked_matrix(df, cols):
+    """Boolean (n, len(cols)) matrix of multi-response mentions, classifying each unique cell value once."""
+    out = np.zeros((len(df), len(cols)), dtype=bool)
+    for j, col in enumerate(cols):
+        codes, uniques = pd.factorize(df[col])
+        flags = np.array([is_checked(v) for v in uniques] + [False], dtype=bool)
+        out[:, j] = flags[codes]
+    return out
+
+def append_nets(table, nets):
+    """Adds single-response net rows (e.g. {'Top 2': [9, 10]}) as sums of their category rows."""
+    labels = table['labels']
+    for net_label, members in nets.items():
+        positions = [labels.index(m) for m in members if m in labels]
+        for key in ('counts', 'n', 'sq'):
+            table[key] = np.vstack([table[key], table[key][positions].sum(axis=0, keepdims=True)])
+        table['labels'] = table['labels'] + [net_label]
+        table['is_net'] = np.append(table['is_net'], True)
+    return table
+
+def build_banner_book(df, target_cols, banner_cols, weight_col='weight', nets=None, multi_response=None):
+    """
+    Builds every weighted target x banner table in one pass.
+
+    Each column is factorized once. For every single-response target, the target code is
+    combined with the codes of all banner columns (offset side by side, after a Total
+    column) and a single `np.bincount` produces the full weighted banner table.
+    Multi-response groups are tabulated from their indicator matrix with one sparse
+    product against the weighted banner one-hot matrix.
+
+    Args:
+        df: DataFrame
+        target_cols: List of question columns (e.g., Q1, Q2...)
+        banner_cols: List of banner columns (e.g., Region, Gender)
+        weight_col: Column containing weights
+        nets: Optional {target: {net_label: members}}. Members are category values for a
+              single-response target (e.g. {'Q1': {'Top 2': [9, 10]}}) or member columns
+              for a multi-response group (a respondent counts once if any is mentioned).
+        multi_response: Optional {group_label: [indicator columns]} for [RM] questions.
+                        Rows are the columns; the base is respondents with any mention.
+
+    Returns:
+        BannerBook.
+    """
+    from scipy import sparse
+
+    nets = nets or {}
+    multi_response = multi_response or {}
+    if weight_col not in df.columns:
+        print(f"Warning: {weight_col} not found. Using unweighted counts.")
+        weights = np.ones(len(df))
+    else:
+        weights = df[weight_col].fillna(0).to_numpy(dtype=float)
+
+    codes = {}
+    for col in dict.fromkeys(list(target_cols) + list(banner_cols)):
+        codes[col] = pd.factorize(df[col], sort=True)
+
+    # Banner columns side by side: slot 0 is Total, then each banner's categories.
+    # Missing banner values go to a trailing trash column, missing targets to a trash row.
+    banners = [('Total', ['Total'])]
+    column_codes = [np.zeros(len(df), dtype=np.int64)]
+    offset = 1
+    for banner in banner_cols:
+        banner_codes, labels = codes[banner]
+        banners.append((banner, list(labels)))
+        column_codes.append(np.where(banner_codes >= 0, banner_codes + offset, -1))
+        offset += len(labels)
+    n_columns = offset
+    column_codes = np.column_stack(column_codes)
+    column_codes[column_codes < 0] = n_columns
+    stacked_weights = np.broadcast_to(weights[:, None], column_codes.shape).ravel()
+    stacked_sq = stacked_weights ** 2
+
+    book = BannerBook(banners=banners)
+    for target in target_cols:
+        target_codes, labels = codes[target]
+        n_categories = len(labels)
+        target_codes = np.where(target_codes >= 0, target_codes, n_categories)
+        cells = (target_codes[:, None] * (n_columns + 1) + column_codes).ravel()
+        size = (n_categories + 1) * (n_columns + 1)
+        table = {
+            'labels': list(labels),
+            'sorted_labels': True,
+            'is_net': np.zeros(n_categories, dtype=bool),
+            'counts': np.bincount(cells, weights=stacked_weights, minlength=size).reshape(n_categories + 1, -1)[:-1, :-1],
+            'n': np.bincount(cells, minlength=size).reshape(n_categories + 1, -1)[:-1, :-1],
+            'sq': np.bincount(cells, weights=stacked_sq, minlength=size).reshape(n_categories + 1, -1)[:-1, :-1],
+        }
+        table.update(base=table['counts'].sum(axis=0), base_n=table['n'].sum(axis=0), base_sq=table['sq'].sum(axis=0))
+        book.tables[target] = append_nets(table, nets.get(target, {}))
+
+    if multi_response:
+        # [w * B | B | w^2 * B] so one product yields weighted, unweighted and squared sums
+        rows = np.repeat(np.arange(len(df)), column_codes.shape[1])
+        one_hot = sparse.csr_matrix(
+            (np.ones(column_codes.size), (rows, column_codes.ravel())), shape=(len(df), n_columns + 1)
+        )[:, :-1]
+        stacked = sparse.hstack([
+            sparse.diags(weights) @ one_hot, one_hot, sparse.diags(weights ** 2) @ one_hot
+        ]).tocsc()
+
+    for group, cols in multi_response.items():
+        checked = checked_matrix(df, cols)
+        group_nets = nets.get(group, {})
+        indicators = [checked]
+        for members in group_nets.values():
+            indicators.append(checked[:, [cols.index(m) for m in members]].any(axis=1, keepdims=True))
+        indicators.append(checked.any(axis=1, keepdims=True))
+        totals = np.asarray((stacked.T @ np.hstack(indicators).astype(float))).T.reshape(-1, 3, n_columns)
+        book.tables[group] = {
+            'labels': list(cols) + list(group_nets),
+            'sorted_labels': False,
+            'is_net': np.array([False] * len(cols) + [True] * len(group_nets)),
+            'counts': totals[:-1, 0], 'n': totals[:-1, 1].round().astype(np.int64), 'sq': totals[:-1, 2],
+            'base': totals[-1, 0], 'base_n': totals[-1, 1].round().astype(np.int64), 'base_sq': totals[-1, 2],
+        }
+    return book
+
+def union_labels(old, new, sort=True):
+    """Existing labels plus unseen new ones, kept sorted when `sort` and the labels allow it."""
+    extra = [label for label in new if label not in old]
+    if not extra or not sort:
+        return list(old) + extra
+    try:
+        return sorted(list(old) + extra)
+    except TypeError:
+        return list(old) + extra
+
+def merge_banner_books(old, new):
+    """
+    Adds two banner books built with the same definitions on disjoint rows.
+
+    Every stored array is a sum over respondents, so tables are aligned on the union
+    of banner and row labels (categories first seen in `new` are inserted) and added.
+    Rows in a given order (multi-response members) keep the first table's order, with
+    unseen labels appended, so a merged book matches a full rebuild.
+    """
+    banners, old_cols, new_cols = [], [], []
+    for (name, old_labels), (_, new_labels) in zip(old.banners, new.banners):
+        labels = union_labels(old_labels, new_labels)
+        base = sum(len(l) for _, l in banners)
+        old_cols += [base + labels.index(l) for l in old_labels]
+        new_cols += [base + labels.index(l) for l in new_labels]
+        banners.append((name, labels))
+    n_columns = sum(len(l) for _, l in banners)
+
+    merged = BannerBook(banners=banners)
+    for target in dict.fromkeys(list(old.tables) + list(new.tables)):
+        parts = [(t, cols) for t, cols in ((old.tables.get(target), old_cols), (new.tables.get(target), new_cols)) if t]
+        categories, net_labels = [], []
+        sort = all(t.get('sorted_labels', True) for t, _ in parts)
+        for t, _ in parts:
+            categories = union_labels(categories, [l for l, net in zip(t['labels'], t['is_net']) if not net], sort)
+            net_labels += [l for l, net in zip(t['labels'], t['is_net']) if net and l not in net_labels]
+        labels = categories + net_labels
+
+        table = {'labels': labels, 'sorted_labels': sort,
+                 'is_net': np.array([False] * len(categories) + [True] * len(net_labels))}
+        for key in ('counts', 'n', 'sq', 'base', 'base_n', 'base_sq'):
+            dtype = parts[0][0][key].dtype
+            table[key] = np.zeros((len(labels), n_columns) if key in ('counts', 'n', 'sq') else n_columns, dtype=dtype)
+        for t, cols in parts:
+            rows = [labels.index(l) for l in t['labels']]
+            for key in ('counts', 'n', 'sq'):
+                table[key][np.ix_(rows, cols)] += t[key]
+            for key in ('base', 'base_n', 'base_sq'):
+                table[key][cols] += t[key]
+        merged.tables[target] = table
+    return merged
+
+def cube_key(target_cols, banner_cols, weight_col, nets=None, multi_response=None, weight_version=None, id_col=None):
+    """
+    Hash of everything that defines the cube's cells and how new rows are found;
+    a changed definition (including switching to or from `id_col`) forces a rebuild.
+    """
+    definition = {
+        'targets': list(target_cols), 'banners': list(banner_cols), 'weight_col': weight_col,
+        'weight_version': weight_version, 'nets': nets or {}, 'multi_response': multi_response or {},
+        'id_col': id_col,
+    }
+    return hashlib.sha256(json.dumps(definition, sort_keys=True, default=str).encode()).hexdigest()
+
+def update_banner_cube(df, target_cols, banner_cols, cache_path, weight_col='weight', nets=None,
+                       multi_response=None, id_col=None, weight_version=None):
+    """
+    Maintains a persisted banner count cube for fieldwork tracking.
+
+    On the first run (or when the cube key changes) the book is built from `df`. Later
+    runs tabulate only the new interviews and add them to the stored counts, so daily
+    cost follows the day's completes rather than the accumulated file. Percentages and
+    significance are re-materialized from the counts by the returned book.
+
+    Weights of already-tabulated interviews must not change between runs; bump
+    `weight_version` when the weighting scheme is re-run to force a rebuild.
+
+    Without `id_col` new rows are found by position, so `df` must be the full accumulated
+    file with earlier rows neither removed nor re-sorted; otherwise rows are silently
+    skipped or counted twice. Pass `id_col` whenever the export order is not guaranteed.
+
+    Args:
+        df: Full accumulated DataFrame. With `id_col`, any frame holding at least all
+            new interviews (e.g. only today's completes).
+        target_cols, banner_cols, weight_col, nets, multi_response: As in `build_banner_book`.
+        cache_path: File holding the cube (pickle).
+        id_col: Optional respondent id column. New rows are ids not yet in the cube;
+                without it, new rows are those past the number already tabulated.
+        weight_version: Optional tag of the weighting run, part of the cube key.
+
+    Returns:
+        (BannerBook, n_new_rows)
+
+    Raises:
+        ValueError: Without `id_col`, if `df` has fewer rows than already tabulated.
+    """
+    key = cube_key(target_cols, banner_cols, weight_col, nets, multi_response, weight_version, id_col)
+    cube = None
+    if os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            cube = pickle.load(f)
+        if cube.get('key') != key:
+            print("Cube definition changed. Rebuilding from the full file.")
+            cube = None
+
+    if cube is None:
+        new_rows = df
+    elif id_col is not None:
+        new_rows = df[~df[id_col].isin(cube['ids'])]
+    else:
+        if len(df) < cube['n_rows']:
+            raise ValueError(
+                f"df has {len(df)} rows but the cube already holds {cube['n_rows']}. Without id_col, "
+                "pass the full accumulated file, or rebuild the cube with id_col to add only new interviews."
+            )
+        new_rows = df.iloc[cube['n_rows']:]
+
+    if cube is not None and len(new_rows) == 0:
+        return cube['book'], 0
+
+    book = build_banner_book(new_rows, target_cols, banner_cols, weight_col, nets, multi_response)
+    if cube is not None:
+        book = merge_banner_books(cube['book'], book)
+
+    ids = None
+    if id_col is not None:
+        ids = new_rows[id_col].to_numpy()
+        if cube is not None:
+            ids = np.concatenate([cube['ids'], ids])
+    cube = {'key': key, 'book': book, 'n_rows': (cube['n_rows'] if cube else 0) + len(new_rows), 'ids': ids}
+
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(cube, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+    return book, len(new_rows)
+
+def write_banner_parquet(book, path, alpha=0.05, min_base=30):
+    """
+    Writes the whole banner book as one long-format Parquet file.
+
+    Columns: target, target_category, is_net, banner, banner_category, letter, count, n,
+    base, pct, sig. Labels are stored as categorical strings so readers can project and
+    filter columns cheaply (e.g. `pd.read_parquet(path, columns=['target', 'pct'])`).
+    """
+    long_df = book.to_long(alpha, min_base)
+    for col in ['target', 'target_category', 'banner', 'banner_category', 'letter', 'sig']:
+        long_df[col] = long_df[col].astype(str).astype('category')
+    long_df.to_parquet(path, index=False)
+    return path
+
+def write_banner_xlsx(book, path, alpha=0.05, min_base=30):
+    """
+    Writes the banner book to a single XLSX workbook in constant-memory mode.
+
+    Sheet 'Contents' indexes the tables; sheet 'Tables' stacks one block per target:
+    title, banner and category headers, column letters, then a % row and a
+    significance-letter row per category, and the weighted base. Rows are written
+    strictly in order, so memory stays flat regardless of book size.
+    """
+    import xlsxwriter
+
+    letters = book.letters()
+    columns = book.columns()
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'nan_inf_to_errors': True})
+    bold = workbook.add_format({'bold': True})
+    pct_format = workbook.add_format({'num_format': '0.0'})
+    contents = workbook.add_worksheet('Contents')
+    tables = workbook.add_worksheet('Tables')
+
+    contents.write_row(0, 0, ['Table', 'Target', 'Row'], bold)
+    row = 0
+    for number, (target, t) in enumerate(book.tables.items(), start=1):
+        contents.write_row(number, 0, [number, str(target), row + 1])
+        # title + 3 header rows + 2 rows per category + base + spacer
+        row += 4 + 2 * len(t['labels']) + 2
+
+    row = 0
+    for number, target in enumerate(book.tables, start=1):
+        t = book.tables[target]
+        pct = book.table(target).to_numpy()
+        sig = book.significance(target, alpha, min_base).to_numpy()
+        tables.write(row, 0, f"Table {number}: {target}", bold)
+        tables.write_row(row + 1, 1, [str(b) for b in columns.get_level_values(0)], bold)
+        tables.write_row(row + 2, 1, [str(c) for c in columns.get_level_values(1)], bold)
+        tables.write_row(row + 3, 1, letters)
+        row += 4
+        for k, label in enumerate(t['labels']):
+            tables.write(row, 0, str(label))
+            tables.write_row(row, 1, pct[k].tolist(), pct_format)
+            tables.write_row(row + 1, 1, sig[k].tolist())
+            row += 2
+        tables.write(row, 0, 'Base', bold)
+        tables.write_row(row, 1, t['base'].round(1).tolist())
+        row += 2
+    workbook.close()
+    return path
+
+def run_automated_crosstabs(df, target_cols, banner_cols, weight_col='weight', output_dir='output',
+                            output_format='parquet', xlsx=False, alpha=0.05, nets=None, multi_response=None):
     """
     Runs a banner (demographic splits) against a list of target questions.
     
@@ -43,18 +533,54 @@ def run_automated_crosstabs(df, target_cols, banner_cols, weight_col='weight', o
         df: DataFrame
         target_cols: List of question columns (e.g., Q1, Q2...)
         banner_cols: List of banner columns (e.g., Region, Gender)
+        output_format: 'parquet' writes the whole book to banner_book.parquet (long format);
+                       'csv' writes the legacy one-file-per-pair Example_{var}_by_{banner}.csv.
+        xlsx: Also write banner_book.xlsx (all tables, constant-memory writer).
+        alpha: Significance level for column letters.
+        nets, multi_response: Net rows and [RM] groups, as in `build_banner_book`.
+
+    Returns:
+        BannerBook.
     """
-    import os
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
-        
+
+    book = build_banner_book(df, target_cols, banner_cols, weight_col, nets, multi_response)
+
+    if output_format == 'parquet':
+        path = write_banner_parquet(book, os.path.join(output_dir, 'banner_book.parquet'), alpha)
+        print(f"Banner book ({len(book.tables)} targets x {len(banner_cols)} banners) saved to {path}")
+    elif output_format == 'csv':
+        write_pair_csvs(book, list(target_cols) + list(multi_response or {}), banner_cols, output_dir)
+    else:
+        raise ValueError(f"Unknown output_format '{output_format}'. Expected 'parquet' or 'csv'.")
+
+    if xlsx:
+        path = write_banner_xlsx(book, os.path.join(output_dir, 'banner_book.xlsx'), alpha)
+        print(f"Banner book workbook saved to {path}")
+
+    return book
+
+def write_pair_csvs(book, target_cols, banner_cols, output_dir):
+    """
+    Legacy output: one CSV of total-% per target x banner pair (net rows excluded).
+
+    Percentages are over the weighted base of the pair, so multi-response groups given
+    in `target_cols` read as the share of respondents mentioning each member.
+    """
     for var in target_cols:
         for banner in banner_cols:
             try:
                 msg = f"Processing {var} x {banner}..."
                 print(msg)
-                ct = weighted_crosstab(df, var, banner, weight_col)
-                
+                rows = ~book.tables[var]['is_net']
+                counts = book.table(var, values='counts')[banner][rows]
+                n = book.table(var, values='n')[banner][rows]
+                counts = counts.loc[n.sum(axis=1) > 0, n.sum(axis=0) > 0]
+                base = pd.Series(book.tables[var]['base'], index=book.columns())[banner]
+                ct = counts / base[counts.columns].sum() * 100
+                ct.columns.name = banner
+
                 # Save
                 safe_var = var.replace('/', '_').replace(' ', '_')[:20]
                 safe_banner = banner.replace('/', '_').replace(' ', '_')[:20]
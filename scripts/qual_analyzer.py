@@ -1,8 +1,12 @@
 import pandas as pd
+import numpy as np
 import argparse
 import sys
 import re
-from collections import Counter
+import os
+import json
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # Default English stop words (minimal)
@@ -19,14 +23,242 @@ def load_stopwords(filepath):
         print(f"⚠️ Warning: Could not load stopwords from {filepath}: {e}")
         return set()
 
-def clean_text(text, stop_words):
+PUNCT_RE = re.compile(r'[^\w\s]')
+
+def tokenize(text):
+    """Lowercased whitespace tokens with punctuation stripped (no stop word filtering)."""
     if not isinstance(text, str):
         return []
-    # Remove special characters and lowercase
-    text = re.sub(r'[^\w\s]', '', text).lower()
+    return PUNCT_RE.sub('', text).lower().split()
+
+def keep_word(word, stop_words):
+    return word not in stop_words and len(word) > 2
+
+def clean_text(text, stop_words):
     # Tokenize and remove stop words
-    words = [w for w in text.split() if w not in stop_words and len(w) > 2]
-    return words
+    return [w for w in tokenize(text) if keep_word(w, stop_words)]
+
+def clean_ngrams(words, n, stop_words):
+    """
+    N-grams of adjacent raw tokens, dropping those that contain a stop word or short word,
+    so words separated by a stop word never form an n-gram. Filtered words for n=1.
+    """
+    if n == 1:
+        return [w for w in words if keep_word(w, stop_words)]
+    kept = [keep_word(w, stop_words) for w in words]
+    return [" ".join(words[i:i + n]) for i in range(len(words) - n + 1) if all(kept[i:i + n])]
+
+def read_chunks(path, columns, filter_expr=None, chunksize=100_000):
+    """
+    Streams a CSV in chunks, reading only `columns` (read as text) plus the filter column.
+    `filter_expr` is the CLI 'Col=Value' filter (case-insensitive contains).
+    """
+    f_col, f_val = filter_expr.split("=") if filter_expr else (None, None)
+    usecols = list(dict.fromkeys(columns + ([f_col] if f_col else [])))
+    for chunk in pd.read_csv(path, usecols=usecols, dtype={c: str for c in columns}, chunksize=chunksize):
+        if f_col:
+            chunk = chunk[chunk[f_col].astype(str).str.contains(f_val, case=False, na=False)]
+        yield chunk
+
+def word_frequencies(path, column, stop_words, filter_expr=None, chunksize=100_000, ngram=1):
+    """
+    Counts words chunk by chunk and merges the per-chunk Counters, so peak memory is
+    bounded by the chunk size plus the vocabulary rather than the total token count.
+    Stop words and short words are dropped once, at vocabulary level.
+
+    With ngram > 1 the n-grams (adjacent tokens, none of them a stop word) are counted
+    in the same pass. Returns {size: Counter} for sizes 1 and `ngram`.
+    """
+    counts = {1: Counter(), ngram: Counter()}
+    for chunk in read_chunks(path, [column], filter_expr, chunksize):
+        chunk_counts = {size: Counter() for size in counts}
+        for text in chunk[column].dropna():
+            words = tokenize(text)
+            chunk_counts[1].update(words)
+            if ngram > 1:
+                chunk_counts[ngram].update(clean_ngrams(words, ngram, stop_words))
+        for size, counter in chunk_counts.items():
+            counts[size].update(counter)
+    counts[1] = Counter({w: n for w, n in counts[1].items() if keep_word(w, stop_words)})
+    return counts
+
+def collocations(counts, ngram, min_count=5):
+    """
+    Ranks n-grams by pointwise mutual information,
+    PMI = log2( p(w1..wn) / (p(w1) * ... * p(wn)) ),
+    keeping n-grams seen at least `min_count` times.
+    """
+    unigrams, grams = counts[1], counts[ngram]
+    n_unigrams, n_grams = sum(unigrams.values()), sum(grams.values())
+    rows = []
+    for gram, freq in grams.items():
+        if freq < min_count:
+            continue
+        log_parts = sum(np.log2(unigrams[w] / n_unigrams) for w in gram.split(" "))
+        rows.append((gram, freq, np.log2(freq / n_grams) - log_parts))
+    pmi_df = pd.DataFrame(rows, columns=['Word', 'Frequency', 'PMI'])
+    return pmi_df.sort_values(by=['PMI', 'Frequency'], ascending=False)
+
+def document_term_matrix(texts, vocab, stop_words, ngram=1):
+    """
+    Sparse (documents x terms) count matrix for a batch of texts. `vocab` maps
+    term -> column and grows in place, so successive chunks share one index.
+    """
+    from scipy import sparse
+    indptr, indices = [0], []
+    for text in texts:
+        indices.extend(vocab.setdefault(term, len(vocab)) for term in clean_ngrams(tokenize(text), ngram, stop_words))
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.int64)
+    dtm = sparse.csr_matrix((data, indices, indptr), shape=(len(texts), len(vocab)))
+    dtm.sum_duplicates()
+    return dtm
+
+def segment_frequencies(path, column, by, stop_words, filter_expr=None, chunksize=100_000, ngram=1):
+    """
+    Term frequencies per segment of `by` in a single pass: each chunk's document-term
+    matrix is multiplied by a sparse (segments x documents) indicator and the
+    segment x term blocks are summed. Returns a long DataFrame [by, Word, Frequency].
+    """
+    from scipy import sparse
+    vocab, segments, blocks = {}, {}, []
+    for chunk in read_chunks(path, [column, by], filter_expr, chunksize):
+        dtm = document_term_matrix(chunk[column], vocab, stop_words, ngram)
+        seg_codes = np.array([segments.setdefault(seg, len(segments)) for seg in chunk[by].fillna("NS/NR")], dtype=np.int64)
+        indicator = sparse.csr_matrix((np.ones(len(seg_codes), dtype=np.int64), (seg_codes, np.arange(len(seg_codes)))),
+                                      shape=(len(segments), len(seg_codes)))
+        blocks.append((indicator @ dtm).tocoo())
+
+    rows = np.concatenate([b.row for b in blocks]) if blocks else np.array([], dtype=np.int64)
+    cols = np.concatenate([b.col for b in blocks]) if blocks else np.array([], dtype=np.int64)
+    data = np.concatenate([b.data for b in blocks]) if blocks else np.array([], dtype=np.int64)
+    counts = sparse.coo_matrix((data, (rows, cols)), shape=(len(segments), len(vocab))).tocsr().tocoo()
+
+    return segment_table(counts, np.array(list(segments), dtype=object), np.array(list(vocab), dtype=object), by)
+
+def segment_table(counts, seg_labels, terms, by):
+    """Long [by, Word, Frequency] table from a sparse (segments x terms) count matrix."""
+    counts = counts.tocoo()
+    freq_df = pd.DataFrame({by: seg_labels[counts.row], 'Word': terms[counts.col], 'Frequency': counts.data})
+    return freq_df.sort_values(by=[by, 'Frequency'], ascending=[True, False])
+
+def tokenize_batch(texts):
+    """
+    Worker task: tokenizes a batch of texts against a local vocabulary.
+    Returns (local terms, CSR indptr, CSR local column indices); no stop words removed.
+    """
+    local, indptr, indices = {}, [0], []
+    for text in texts:
+        indices.extend(local.setdefault(w, len(local)) for w in tokenize(text))
+        indptr.append(len(indices))
+    return list(local), np.array(indptr, dtype=np.int64), np.array(indices, dtype=np.int64)
+
+def build_term_matrix(path, column, by=None, filter_expr=None, chunksize=100_000, n_jobs=1):
+    """
+    Tokenizes the CSV into a (documents x words) CSR count matrix over one global vocabulary.
+    Row chunks are tokenized in `n_jobs` worker processes (at most 2 * n_jobs chunks in
+    flight) and their local vocabularies are remapped to global ids in input order.
+    Raw tokens are kept, so any stop word list can be applied later by masking columns.
+
+    Returns dict with 'matrix', 'terms' and, when `by` is given, 'segments' (per-row codes)
+    and 'segment_labels'.
+    """
+    from scipy import sparse
+    vocab, segments, seg_codes, pieces = {}, {}, [], []
+
+    def merge(result):
+        terms, indptr, indices = result
+        remap = np.array([vocab.setdefault(t, len(vocab)) for t in terms], dtype=np.int64)
+        pieces.append((indptr, remap[indices]))
+
+    chunks = read_chunks(path, [column] + ([by] if by else []), filter_expr, chunksize)
+    pool = ProcessPoolExecutor(max_workers=n_jobs) if n_jobs > 1 else None
+    try:
+        pending = deque()
+        for chunk in chunks:
+            if by:
+                seg_codes.extend(segments.setdefault(seg, len(segments)) for seg in chunk[by].fillna("NS/NR"))
+            texts = chunk[column].tolist()
+            if pool is None:
+                merge(tokenize_batch(texts))
+                continue
+            pending.append(pool.submit(tokenize_batch, texts))
+            if len(pending) >= 2 * n_jobs:
+                merge(pending.popleft().result())
+        while pending:
+            merge(pending.popleft().result())
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    offsets = np.cumsum([0] + [len(indices) for _, indices in pieces])
+    indptr = np.concatenate([[0]] + [ptr[1:] + off for (ptr, _), off in zip(pieces, offsets)])
+    indices = np.concatenate([np.zeros(0, dtype=np.int64)] + [indices for _, indices in pieces])
+    matrix = sparse.csr_matrix((np.ones(len(indices), dtype=np.int32), indices, indptr),
+                               shape=(len(indptr) - 1, len(vocab)))
+    matrix.sum_duplicates()
+
+    term_matrix = {'matrix': matrix, 'terms': np.array(list(vocab), dtype=object)}
+    if by:
+        term_matrix['segments'] = np.array(seg_codes, dtype=np.int64)
+        term_matrix['segment_labels'] = np.array(list(segments), dtype=object)
+    return term_matrix
+
+def term_matrix_key(path, column, by=None, filter_expr=None):
+    """Identifies a cached term matrix: input file (size, mtime) and the rows/columns it covers."""
+    stat = os.stat(path)
+    return json.dumps({'input': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                       'column': column, 'by': by, 'filter': filter_expr}, sort_keys=True)
+
+def cache_path_npz(cache_path):
+    """np.savez_compressed appends '.npz' to other paths, so save and load both use the suffixed name."""
+    return cache_path if cache_path.endswith('.npz') else cache_path + '.npz'
+
+def save_term_matrix(cache_path, term_matrix, key):
+    matrix = term_matrix['matrix']
+    arrays = {'data': matrix.data, 'indices': matrix.indices, 'indptr': matrix.indptr,
+              'shape': np.array(matrix.shape), 'terms': term_matrix['terms'].astype(str), 'key': np.array(key)}
+    if 'segments' in term_matrix:
+        arrays['segments'] = term_matrix['segments']
+        arrays['segment_labels'] = term_matrix['segment_labels'].astype(str)
+    np.savez_compressed(cache_path, **arrays)
+
+def load_term_matrix(cache_path, key):
+    """Loads a cached term matrix, or returns None when missing or built from other inputs."""
+    from scipy import sparse
+    if not Path(cache_path).exists():
+        return None
+    with np.load(cache_path) as cache:
+        if str(cache['key']) != key:
+            return None
+        term_matrix = {
+            'matrix': sparse.csr_matrix((cache['data'], cache['indices'], cache['indptr']), shape=tuple(cache['shape'])),
+            'terms': cache['terms'].astype(object),
+        }
+        if 'segments' in cache:
+            term_matrix['segments'] = cache['segments']
+            term_matrix['segment_labels'] = cache['segment_labels'].astype(object)
+    return term_matrix
+
+def matrix_frequencies(term_matrix, stop_words, by=None):
+    """
+    Word frequencies from a term matrix: totals are aggregated once and stop words /
+    short words are removed by masking vocabulary columns, so no retokenization is needed.
+    """
+    from scipy import sparse
+    matrix, terms = term_matrix['matrix'], term_matrix['terms']
+    keep = np.fromiter((keep_word(t, stop_words) for t in terms), dtype=bool, count=len(terms))
+    if by is None:
+        freq = np.asarray(matrix.sum(axis=0)).ravel()
+        keep &= freq > 0
+        freq_df = pd.DataFrame({'Word': terms[keep], 'Frequency': freq[keep]})
+        return freq_df.sort_values(by='Frequency', ascending=False)
+    seg_codes, seg_labels = term_matrix['segments'], term_matrix['segment_labels']
+    indicator = sparse.csr_matrix((np.ones(len(seg_codes), dtype=np.int64), (seg_codes, np.arange(len(seg_codes)))),
+                                  shape=(len(seg_labels), matrix.shape[0]))
+    counts = (indicator @ matrix).tocsc()[:, np.flatnonzero(keep)]
+    counts.eliminate_zeros()
+    return segment_table(counts, seg_labels, terms[keep], by)
 
 def main():
     parser = argparse.ArgumentParser(description="Survey Qualitative Analyzer")
@@ -35,6 +267,13 @@ def main():
     parser.add_argument("-o", "--output", help="Output frequency CSV", default="word_freq.csv")
     parser.add_argument("--filter", help="Optional filter in 'Col=Value' format")
     parser.add_argument("--stopwords", help="Path to stopwords file (txt, one per line)", default=None)
+    parser.add_argument("--chunksize", help="Rows read per chunk", type=int, default=100_000)
+    parser.add_argument("--ngram", help="Term size: 1 (words), 2 (bigrams) or 3 (trigrams)", type=int, choices=[1, 2, 3], default=1)
+    parser.add_argument("--collocations", help="Rank n-grams by PMI instead of frequency", action="store_true")
+    parser.add_argument("--min-count", help="Minimum n-gram frequency for PMI ranking", type=int, default=5)
+    parser.add_argument("--by", help="Segment column: term frequencies per segment value", default=None)
+    parser.add_argument("--jobs", help="Worker processes for tokenization (builds a term matrix)", type=int, default=1)
+    parser.add_argument("--cache", help="Term matrix cache (.npz), reused across runs and stop word lists", default=None)
     
     args = parser.parse_args()
     
@@ -47,24 +286,46 @@ def main():
             stop_words = DEFAULT_STOP_WORDS
             print("ℹ️ Using default English stop words")
 
-        df = pd.read_csv(args.input)
-        
-        # Apply filter if provided
-        if args.filter:
-            f_col, f_val = args.filter.split("=")
-            df = df[df[f_col].astype(str).str.contains(f_val, case=False, na=False)]
+        header = pd.read_csv(args.input, nrows=0).columns
+        for col in [args.column, args.by]:
+            if col and col not in header:
+                print(f"❌ Column '{col}' not found in CSV.")
+                sys.exit(1)
             
-        if args.column not in df.columns:
-            print(f"❌ Column '{args.column}' not found in CSV.")
-            sys.exit(1)
-            
-        all_words = []
-        for text in df[args.column]:
-            all_words.extend(clean_text(text, stop_words))
-            
-        counts = Counter(all_words)
-        freq_df = pd.DataFrame(counts.items(), columns=['Word', 'Frequency']).sort_values(by='Frequency', ascending=False)
+        # Stream the file in chunks (only the needed columns)
+        if args.jobs == -1:
+            args.jobs = os.cpu_count()
+        if args.cache:
+            args.cache = cache_path_npz(args.cache)
+        if args.collocations and (args.ngram == 1 or args.by):
+            print("⚠️ Warning: --collocations needs --ngram 2 or 3 and no --by; ranking by frequency instead")
+        use_matrix = args.jobs > 1 or args.cache
+        if use_matrix and args.ngram > 1:
+            print("⚠️ Warning: --jobs/--cache apply to single words; n-grams are counted in streaming mode")
+            use_matrix = False
+
+        if use_matrix:
+            key = term_matrix_key(args.input, args.column, args.by, args.filter)
+            term_matrix = load_term_matrix(args.cache, key) if args.cache else None
+            if term_matrix is not None:
+                print(f"ℹ️ Reusing term matrix from {args.cache}")
+            else:
+                term_matrix = build_term_matrix(args.input, args.column, args.by, args.filter, args.chunksize, args.jobs)
+                if args.cache:
+                    save_term_matrix(args.cache, term_matrix, key)
+                    print(f"ℹ️ Term matrix cached to {args.cache}")
+            freq_df = matrix_frequencies(term_matrix, stop_words, args.by)
+        elif args.by:
+            freq_df = segment_frequencies(args.input, args.column, args.by, stop_words, args.filter, args.chunksize, args.ngram)
+        else:
+            counts = word_frequencies(args.input, args.column, stop_words, args.filter, args.chunksize, args.ngram)
+            if args.collocations and args.ngram > 1:
+                freq_df = collocations(counts, args.ngram, args.min_count)
+            else:
+                freq_df = pd.DataFrame(counts[args.ngram].items(), columns=['Word', 'Frequency']).sort_values(by='Frequency', ascending=False)
         
+        if args.by:
+            print(f"ℹ️ {freq_df[args.by].nunique()} segments of '{args.by}'")
         freq_df.to_csv(args.output, index=False)
         print(f"✅ Qualitative analysis complete. Word frequencies saved to {args.output}")
         
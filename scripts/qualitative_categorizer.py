@@ -1,4 +1,10 @@
+import os
+import re
+import unicodedata
+import numpy as np
 import pandas as pd
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 def categorize_text(text: str, category_dict: dict, default_category: str = "Outros", missing_category: str = "NS/NR") -> str:
     """
@@ -26,7 +32,181 @@ def categorize_text(text: str, category_dict: dict, default_category: str = "Out
             
     return default_category
 
-def apply_qualitative_categorization(df: pd.DataFrame, source_col: str, target_col: str, category_dict: dict):
+TOKEN_RE = re.compile(r"\w+")
+
+# Light Portuguese plural reduction, applied to accent-folded tokens longer than 3 chars
+STEM_SUFFIXES = [("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"), ("ois", "ol"),
+                 ("ns", "m"), ("res", "r"), ("zes", "z"), ("s", "")]
+
+# Chars that must remain before the suffix ('mais' -> 'mal', 'dois' -> 'dol' are not plurals)
+MIN_STEM_LENGTH = 2
+
+# Function words and invariant nouns that end like plurals but are not
+STEM_EXCEPTIONS = {"mais", "demais", "jamais", "depois", "pois", "menos", "antes", "apos", "atras",
+                   "simples", "lapis", "onibus", "virus", "pires", "ingles", "portugues", "pais"}
+
+def light_stem(token: str) -> str:
+    """
+    Reduces Portuguese plurals to the singular form, leaving function words alone.
+
+    >>> [light_stem(t) for t in ["precos", "opcoes", "animais", "luzes", "bares"]]
+    ['preco', 'opcao', 'animal', 'luz', 'bar']
+    >>> [light_stem(t) for t in ["mais", "dois", "tres", "depois", "menos", "pais"]]
+    ['mais', 'dois', 'tres', 'depois', 'menos', 'pais']
+    """
+    if len(token) <= 3 or token in STEM_EXCEPTIONS:
+        return token
+    for suffix, replacement in STEM_SUFFIXES:
+        if token.endswith(suffix):
+            stem = token[:-len(suffix)]
+            return stem + replacement if len(stem) >= MIN_STEM_LENGTH else token
+    return token
+
+class TextNormalizer:
+    """
+    Normalization applied identically to verbatims and keywords before matching.
+
+    Lowercases, folds accents ('preço' -> 'preco'), tokenizes on word characters and
+    optionally stems. With `word_boundaries` the tokens are space-padded, so a keyword
+    only matches whole tokens ('bar' no longer matches 'barulho'). Results are memoized,
+    since verbatims repeat heavily.
+
+    Args:
+        fold_accents (bool): Strip diacritics.
+        word_boundaries (bool): Match whole tokens only.
+        stem (bool): Apply `light_stem` to each token.
+    """
+
+    def __init__(self, fold_accents: bool = True, word_boundaries: bool = True, stem: bool = False):
+        self.fold_accents = fold_accents
+        self.word_boundaries = word_boundaries
+        self.stem = stem
+        self.cache = {}
+
+    def __call__(self, text: str) -> str:
+        cached = self.cache.get(text)
+        if cached is not None:
+            return cached
+        normalized = str(text).lower()
+        if self.fold_accents:
+            normalized = "".join(ch for ch in unicodedata.normalize("NFKD", normalized) if not unicodedata.combining(ch))
+        tokens = TOKEN_RE.findall(normalized)
+        if self.stem:
+            tokens = [light_stem(t) for t in tokens]
+        normalized = " ".join(tokens)
+        if self.word_boundaries:
+            normalized = f" {normalized} "
+        self.cache[text] = normalized
+        return normalized
+
+class KeywordCategorizer:
+    """
+    Aho-Corasick automaton over every keyword of a codeframe.
+
+    Each text is scanned once, whatever the number of keywords; every automaton
+    state carries a bitmask of the categories whose keywords end there. The lowest
+    set bit gives the same first-match answer as `categorize_text` (categories are
+    tried in dict order), and all set bits give multi-label output.
+
+    Args:
+        category_dict (dict): Categories and their keywords, as in `categorize_text`.
+        default_category (str): Category assigned if no keywords match.
+        missing_category (str): Category assigned if text is null or empty.
+        normalizer (TextNormalizer): Optional normalization of keywords and texts;
+                                     plain lowercasing when omitted.
+    """
+
+    def __init__(self, category_dict: dict, default_category: str = "Outros", missing_category: str = "NS/NR",
+                 normalizer: TextNormalizer = None):
+        self.categories = list(category_dict.keys())
+        self.normalizer = normalizer
+        self.default_category = default_category
+        self.missing_category = missing_category
+        self.always = 0
+        self.goto = [{}]
+        self.output = [0]
+
+        for bit, keywords in enumerate(category_dict.values()):
+            for kw in keywords:
+                if normalizer is not None:
+                    kw = normalizer(kw)
+                    if not kw.strip():
+                        # Punctuation-only keyword: no tokens left to match
+                        continue
+                if kw == "":
+                    # An empty keyword is a substring of every text
+                    self.always |= 1 << bit
+                    continue
+                node = 0
+                for ch in kw:
+                    if ch not in self.goto[node]:
+                        self.goto.append({})
+                        self.output.append(0)
+                        self.goto[node][ch] = len(self.goto) - 1
+                    node = self.goto[node][ch]
+                self.output[node] |= 1 << bit
+
+        # Breadth-first failure links, folded into a full transition table so the scan
+        # never walks failure chains; outputs inherit those of their failure state
+        fail = [0] * len(self.goto)
+        self.delta = [dict(self.goto[0])] + [None] * (len(self.goto) - 1)
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            self.delta[node] = {**self.delta[fail[node]], **self.goto[node]} if node else self.delta[0]
+            for ch, child in self.goto[node].items():
+                fail[child] = self.delta[fail[node]].get(ch, 0) if node else 0
+                self.output[child] |= self.output[fail[child]]
+                queue.append(child)
+
+    def match_mask(self, text_lower: str) -> int:
+        """Bitmask of the categories with at least one keyword in `text_lower`."""
+        delta, output = self.delta, self.output
+        mask = self.always
+        node = 0
+        for ch in text_lower:
+            node = delta[node].get(ch, 0)
+            mask |= output[node]
+        return mask
+
+    def labels(self, mask: int) -> list:
+        """Category names of a bitmask, in codeframe order."""
+        return [cat for bit, cat in enumerate(self.categories) if mask >> bit & 1]
+
+    def categorize(self, text, multi_label: bool = False):
+        """
+        Categorizes one text.
+
+        Returns:
+            The first matching category (str), or with `multi_label` the list of all
+            matching categories; default/missing categories otherwise.
+        """
+        if not text or pd.isna(text):
+            return [self.missing_category] if multi_label else self.missing_category
+        mask = self.match_mask(self.normalizer(text) if self.normalizer else str(text).lower())
+        if not mask:
+            return [self.default_category] if multi_label else self.default_category
+        if multi_label:
+            return self.labels(mask)
+        return self.categories[(mask & -mask).bit_length() - 1]
+
+    def categorize_series(self, series: pd.Series, multi_label: bool = False, sep: str = ";") -> pd.Series:
+        """
+        Categorizes a column, normalizing and scanning each distinct verbatim only once.
+
+        Values are factorized; the unique texts are categorized and the results mapped
+        back through the integer codes.
+        """
+        codes, uniques = pd.factorize(series)
+        results = []
+        for text in uniques:
+            result = self.categorize(text, multi_label)
+            results.append(sep.join(result) if multi_label else result)
+        results.append(self.missing_category)
+        return pd.Series(np.asarray(results, dtype=object)[codes], index=series.index)
+
+def apply_qualitative_categorization(df: pd.DataFrame, source_col: str, target_col: str, category_dict: dict,
+                                     multi_label: bool = False, sep: str = ";", normalizer: TextNormalizer = None):
     """
     Applies qualitative categorization to an entire DataFrame column.
     
@@ -35,20 +215,120 @@ def apply_qualitative_categorization(df: pd.DataFrame, source_col: str, target_c
         source_col (str): The column containing raw spontaneous text.
         target_col (str): The new column to store the categorical result.
         category_dict (dict): Dictionary of categories and keywords.
+        multi_label (bool): Keep every matching category, joined with `sep`
+                            (the multi-response format read by `survey_pca`).
+        sep (str): Separator for multi-label output.
+        normalizer (TextNormalizer): Optional accent folding / whole-token / stemming
+                                     normalization, e.g. TextNormalizer(stem=True).
         
     Returns:
         pd.DataFrame: The updated DataFrame.
     """
+    categorizer = KeywordCategorizer(category_dict, normalizer=normalizer)
     df_copy = df.copy()
-    df_copy[target_col] = df_copy[source_col].apply(lambda x: categorize_text(x, category_dict))
+    df_copy[target_col] = categorizer.categorize_series(df_copy[source_col], multi_label, sep)
+    if multi_label:
+        counts = df_copy[target_col].str.split(sep).explode().value_counts() / len(df_copy) * 100
+    else:
+        counts = df_copy[target_col].value_counts(normalize=True) * 100
     
     # Print summary
-    counts = df_copy[target_col].value_counts(normalize=True) * 100
     print(f"Categorization Summary for '{source_col}':")
     print(counts.round(2).astype(str) + "%")
     
     return df_copy
 
+_WORKER = {}
+
+def _init_categorizer_worker(codeframes, normalizer, multi_label, sep, default_category, missing_category):
+    _WORKER.update(codeframes=codeframes, normalizer=normalizer, multi_label=multi_label, sep=sep,
+                   default_category=default_category, missing_category=missing_category, categorizers={})
+
+def _categorize_chunk(frame_key, texts):
+    categorizers = _WORKER['categorizers']
+    if frame_key not in categorizers:
+        categorizers[frame_key] = KeywordCategorizer(_WORKER['codeframes'][frame_key], _WORKER['default_category'],
+                                                     _WORKER['missing_category'], normalizer=_WORKER['normalizer'])
+    categorizer, multi_label, sep = categorizers[frame_key], _WORKER['multi_label'], _WORKER['sep']
+    if multi_label:
+        return [sep.join(categorizer.categorize(t, multi_label=True)) for t in texts]
+    return [categorizer.categorize(t) for t in texts]
+
+def categorize_columns(df: pd.DataFrame, codeframes: dict, target_suffix: str = "_cat", multi_label: bool = False,
+                       sep: str = ";", normalizer: TextNormalizer = None, n_jobs: int = None, chunk_size: int = 5000,
+                       default_category: str = "Outros", missing_category: str = "NS/NR"):
+    """
+    Categorizes many open-ended columns in one batch, writing the results into `df` in place.
+
+    Columns sharing a codeframe are deduplicated together, so each distinct verbatim is
+    categorized once per codeframe; the unique texts are split into chunks and fanned out
+    to a process pool, and results are mapped back through factorized codes.
+
+    Args:
+        df (pd.DataFrame): The DataFrame containing the data (modified in place).
+        codeframes (dict): {source_col: category_dict} or {source_col: (target_col, category_dict)}.
+        target_suffix (str): Suffix for target columns when not given explicitly.
+        multi_label (bool): Keep every matching category, joined with `sep`.
+        sep (str): Separator for multi-label output.
+        normalizer (TextNormalizer): Optional normalization, as in `KeywordCategorizer`.
+        n_jobs (int): Worker processes (None or 1 = serial, -1 = all cores).
+        chunk_size (int): Unique texts per task.
+        default_category (str): Category assigned if no keywords match.
+        missing_category (str): Category assigned if text is null or empty.
+
+    Returns:
+        pd.DataFrame: Summary with columns source, target, category, count, pct
+                      (pct over rows; multi-label rows count once per category).
+    """
+    # Group source columns by codeframe
+    frames, groups, targets = {}, {}, {}
+    for source_col, spec in codeframes.items():
+        target_col, category_dict = spec if isinstance(spec, tuple) else (f"{source_col}{target_suffix}", spec)
+        targets[source_col] = target_col
+        for key, frame in frames.items():
+            if frame == category_dict:
+                break
+        else:
+            key = len(frames)
+            frames[key] = category_dict
+        groups.setdefault(key, []).append(source_col)
+
+    tasks = []
+    encoded = {}
+    for key, cols in groups.items():
+        codes, uniques = pd.factorize(pd.concat([df[c] for c in cols], ignore_index=True))
+        encoded[key] = (cols, codes.reshape(len(cols), len(df)), len(uniques))
+        tasks += [(key, start, list(uniques[start:start + chunk_size])) for start in range(0, len(uniques), chunk_size)]
+
+    initargs = (frames, normalizer, multi_label, sep, default_category, missing_category)
+    n_jobs = os.cpu_count() if n_jobs == -1 else (n_jobs or 1)
+    if n_jobs == 1:
+        _init_categorizer_worker(*initargs)
+        chunk_results = [_categorize_chunk(key, texts) for key, _, texts in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_categorizer_worker, initargs=initargs) as pool:
+            chunk_results = list(pool.map(_categorize_chunk, [t[0] for t in tasks], [t[2] for t in tasks]))
+
+    results = {key: np.empty(n_unique + 1, dtype=object) for key, (_, _, n_unique) in encoded.items()}
+    for (key, start, texts), chunk in zip(tasks, chunk_results):
+        results[key][start:start + len(texts)] = chunk
+    for result in results.values():
+        # Slot for the -1 code of null values, as in `categorize_series`
+        result[-1] = missing_category
+
+    summaries = []
+    for key, (cols, codes, _) in encoded.items():
+        for source_col, col_codes in zip(cols, codes):
+            target_col = targets[source_col]
+            df[target_col] = results[key][col_codes]
+            values = df[target_col].str.split(sep).explode() if multi_label else df[target_col]
+            counts = values.value_counts()
+            summaries.append(pd.DataFrame({
+                'source': source_col, 'target': target_col, 'category': counts.index,
+                'count': counts.to_numpy(), 'pct': counts.to_numpy() / len(df) * 100,
+            }))
+    return pd.concat(summaries, ignore_index=True) if summaries else pd.DataFrame(columns=['source', 'target', 'category', 'count', 'pct'])
+
 # Example Usage:
 # if __name__ == "__main__":
 #     df = pd.DataFrame({"feedback": ["The band was great", "Too expensive", "I loved the music", None]})
@@ -1,9 +1,16 @@
 import pandas as pd
+import numpy as np
 import json
 import argparse
+from dataclasses import dataclass
 import sys
 import os
 
+# Cell values treated as "not checked" for weighted (dict) columns
+FALSY_VALUES = ["nan", "none", "0", "false", "no", "não"]
+# Cell values worth one point for legacy (list) columns
+CHECKED_VALUES = ["1", "true", "yes", "x", "sim", "checked"]
+
 def normalize_points(row, columns, max_points, scale_to):
     """Sums points from specific columns and normalizes to a new scale."""
     points_sum = 0
@@ -11,54 +18,252 @@ def normalize_points(row, columns, max_points, scale_to):
     # If columns is a dict, it implies weighting {col_name: weight}
     if isinstance(columns, dict):
         for col, weight in columns.items():
-            val = str(row.get(col, "")).strip()
             # If cell is not empty/null/0, add the weight
-            if val and val.lower() not in ["nan", "none", "0", "false", "no", "não"]:
-                points_sum += weight
+            points_sum += weight * cell_points(row.get(col, ""), weighted=True)
     
     # Legacy list support (weight=1)
     elif isinstance(columns, list):
         for col in columns:
-            val = str(row.get(col, "0")).lower()
-            if val in ["1", "true", "yes", "x", "sim", "checked"]:
-                points_sum += 1
-            elif val.isdigit():
-                points_sum += int(val)
+            points_sum += cell_points(row.get(col, "0"), weighted=False)
             
     return (points_sum / max_points) * scale_to if max_points > 0 else 0
 
+def cell_points(val, weighted):
+    """
+    Points of one raw cell under the dict (weighted) or list rule of `normalize_points`.
+    Integral floats count as integers, so a 0/1 column read as 0.0/1.0 (blanks present)
+    scores the same as when read as text.
+    """
+    if isinstance(val, float) and val.is_integer():
+        val = int(val)
+    if weighted:
+        val = str(val).strip()
+        return int(bool(val) and val.lower() not in FALSY_VALUES)
+    val = str(val).lower()
+    if val in CHECKED_VALUES:
+        return 1
+    return int(val) if val.isdigit() else 0
+
+def checked_points(series, weighted):
+    """
+    Vectorized `normalize_points` rule for one column: the rule is evaluated once per
+    distinct value (factorize) and gathered back, with missing cells scoring 0.
+    """
+    codes, uniques = pd.factorize(series)
+    lookup = np.array([cell_points(val, weighted) for val in uniques] + [0], dtype=np.int64)
+    return lookup[codes]
+
+@dataclass
+class ScoringPlan:
+    """
+    A config compiled against a CSV header. Every score is a column of one value matrix laid
+    out as [normalizations | numeric inputs | domains | Escore Final]; normalizations are a
+    single points-matrix product and domains are item-weighted means over resolved
+    value-matrix indices. Missing items are skipped (config "missing": "zero" restores the
+    legacy fill-with-0), so a domain is NaN only when all of its items are missing.
+    """
+    point_columns: list          # [(col, weighted)] converted by checked_points
+    norm_matrix: np.ndarray      # (point columns x normalizations): weight * scale_to / max_points
+    normalizations: list
+    numeric_columns: list        # raw input columns averaged by domains (coerced to numeric)
+    domains: list                # [(domain name, value-matrix indices, item weights)]
+    final_index: np.ndarray      # value-matrix indices averaged into "Escore Final"
+    fill_missing: bool = False   # legacy: missing items count as 0
+
+    @property
+    def input_columns(self):
+        """Columns to read from the input (everything else is skipped)."""
+        return list(dict.fromkeys([col for col, _ in self.point_columns] + self.numeric_columns))
+
+    @property
+    def dtypes(self):
+        """Point columns are read as text so chunks never disagree on inferred types."""
+        return {col: str for col, _ in self.point_columns}
+
+    @property
+    def output_columns(self):
+        return self.normalizations + [name for name, _, _ in self.domains] + (["Escore Final"] if self.domains else [])
+
+    def evaluate(self, frame):
+        """Returns the (rows x output columns) score matrix for a frame or chunk."""
+        n_norms, n_numeric = len(self.normalizations), len(self.numeric_columns)
+        values = np.zeros((len(frame), n_norms + n_numeric + len(self.domains) + 1))
+        if self.point_columns:
+            points = np.column_stack([checked_points(frame[col], weighted) for col, weighted in self.point_columns])
+            values[:, :n_norms] = points @ self.norm_matrix
+        for j, col in enumerate(self.numeric_columns):
+            numeric = pd.to_numeric(frame[col], errors='coerce')
+            values[:, n_norms + j] = numeric.fillna(0) if self.fill_missing else numeric
+        for j, (_, index, weights) in enumerate(self.domains):
+            values[:, n_norms + n_numeric + j] = nan_weighted_mean(values[:, index], weights)
+        if self.domains:
+            values[:, -1] = nan_weighted_mean(values[:, self.final_index], np.ones(len(self.final_index)))
+            return np.delete(values, np.s_[n_norms:n_norms + n_numeric], axis=1)
+        return values[:, :n_norms]
+
+    def score_frame(self, frame):
+        return pd.DataFrame(self.evaluate(frame), columns=self.output_columns, index=frame.index)
+
+def nan_weighted_mean(values, weights):
+    """Row-wise weighted mean skipping NaNs; NaN where every item is missing."""
+    present = ~np.isnan(values)
+    total = present @ weights
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(total > 0, np.where(present, values, 0) @ weights / total, np.nan)
+
+def compile_plan(config, columns):
+    """
+    Compiles a scoring config against the available input `columns`.
+    Names resolve like sequential assignment would: a domain sees earlier domains,
+    then normalizations, then raw input columns. Domains are a list of columns or,
+    like normalizations, a {col: weight} dict.
+    """
+    columns = set(columns)
+    point_index, normalizations, norm_columns = {}, [], []
+    for norm_col, settings in config.get("normalizations", {}).items():
+        spec = settings["columns"]
+        weighted = isinstance(spec, dict)
+        weights = spec if weighted else {}
+        if not weighted:
+            for col in spec:
+                weights[col] = weights.get(col, 0) + 1
+        scale = settings["scale_to"] / settings["max_points"] if settings["max_points"] > 0 else 0
+        column_weights = {}
+        for col, weight in weights.items():
+            # Missing columns score nothing, as in normalize_points
+            if col in columns:
+                column_weights[point_index.setdefault((col, weighted), len(point_index))] = weight * scale
+        norm_columns.append(column_weights)
+        normalizations.append(norm_col)
+
+    norm_matrix = np.zeros((len(point_index), len(normalizations)))
+    for j, column_weights in enumerate(norm_columns):
+        for i, weight in column_weights.items():
+            norm_matrix[i, j] = weight
+
+    resolved = {name: ("norm", j) for j, name in enumerate(normalizations)}
+    numeric_columns, domain_refs = [], []
+    for domain_name, cols in config.get("domains", {}).items():
+        missing = [c for c in cols if c not in resolved and c not in columns]
+        if missing:
+            raise ValueError(f"Domain '{domain_name}' references missing columns: {missing}")
+        refs = []
+        item_weights = np.array(list(cols.values()) if isinstance(cols, dict) else [1] * len(cols), dtype=float)
+        for col in cols:
+            if col not in resolved:
+                resolved[col] = ("numeric", len(numeric_columns))
+                numeric_columns.append(col)
+            refs.append(resolved[col])
+        domain_refs.append((domain_name, refs, item_weights))
+        resolved[domain_name] = ("domain", len(domain_refs) - 1)
+
+    offsets = {"norm": 0, "numeric": len(normalizations), "domain": len(normalizations) + len(numeric_columns)}
+    domains = [(name, np.array([offsets[kind] + j for kind, j in refs], dtype=np.int64), weights)
+               for name, refs, weights in domain_refs]
+    final_index = offsets["domain"] + np.arange(len(domains))
+    fill_missing = config.get("missing", "skip") == "zero"
+    return ScoringPlan(list(point_index), norm_matrix, normalizations, numeric_columns, domains, final_index, fill_missing)
+
 def calculate_scores(df, config):
-    """Applies normalizations and calculates domain averages."""
-    # 1. Apply Normalizations
-    if "normalizations" in config:
-        for norm_col, settings in config["normalizations"].items():
-            df[norm_col] = df.apply(
-                lambda r: normalize_points(r, settings["columns"], settings["max_points"], settings["scale_to"]),
-                axis=1
-            )
-    
-    # 2. Calculate Domain Scores
-    domain_columns = []
-    if "domains" in config:
-        for domain_name, cols in config["domains"].items():
-            # Ensure columns exist and are numeric
-            for col in cols:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            
-            df[domain_name] = df[cols].mean(axis=1)
-            domain_columns.append(domain_name)
-    
-    # 3. Calculate Final Escore
-    if domain_columns:
-        df["Escore Final"] = df[domain_columns].mean(axis=1)
-    
+    """Applies normalizations and calculates domain averages (input columns are left untouched)."""
+    plan = compile_plan(config, df.columns)
+    scores = plan.evaluate(df)
+    for j, col in enumerate(plan.output_columns):
+        df[col] = scores[:, j]
     return df
 
+def segment_labels(series):
+    """Segment values as text, missing as "NS/NR"; integral floats print without '.0'."""
+    if pd.api.types.is_float_dtype(series) and (series.dropna() % 1 == 0).all():
+        series = series.astype("Int64")
+    return series.astype(str).where(series.notna(), "NS/NR")
+
+def read_dtypes(plan, segment_cols=None):
+    """CSV dtypes shared by the in-memory and streaming reads: point and segment columns as text."""
+    return {**plan.dtypes, **{col: str for col in (segment_cols or [])}}
+
+def segment_sums(scores, segments=None, weights=None):
+    """
+    Mergeable per-segment partial sums for every score column in one groupby per segment
+    variable: valid count n, sum_w, sum_wx and sum_w2 (missing scores skipped).
+    `segments` is a DataFrame of segment columns; a 'Total' row is always included.
+    Returns a frame indexed by (Segment, Value) with (metric, stat) columns.
+    """
+    w = np.ones(len(scores)) if weights is None else pd.to_numeric(weights, errors='coerce').fillna(0).to_numpy(dtype=float)
+    x = scores.to_numpy(dtype=float)
+    valid = ~np.isnan(x)
+    wv = valid * w[:, None]
+    stats = {'n': valid.astype(np.int64), 'sum_w': wv, 'sum_wx': np.where(valid, x, 0) * w[:, None], 'sum_w2': wv * w[:, None]}
+    parts = pd.concat({stat: pd.DataFrame(arr, columns=scores.columns, index=scores.index) for stat, arr in stats.items()},
+                      axis=1).swaplevel(axis=1)
+
+    blocks = [parts.sum().to_frame().T.set_axis(pd.MultiIndex.from_tuples([("Total", "Total")], names=["Segment", "Value"]))]
+    for seg_col in ([] if segments is None else segments.columns):
+        grouped = parts.groupby(segment_labels(segments[seg_col])).sum()
+        grouped.index = pd.MultiIndex.from_product([[seg_col], grouped.index], names=["Segment", "Value"])
+        blocks.append(grouped)
+    return pd.concat(blocks)
+
+def merge_segment_sums(partials):
+    """Combines partial sums from several chunks."""
+    return pd.concat(partials).groupby(level=["Segment", "Value"], sort=False).sum()
+
+def segment_summary(sums):
+    """
+    Per-segment weighted mean, unweighted count and Kish effective N,
+    (sum w)^2 / sum w^2, for every score column, in long format.
+    """
+    rows = []
+    for metric in sums.columns.get_level_values(0).unique():
+        stat = sums[metric]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rows.append(pd.DataFrame({
+                'Metric': metric,
+                'N': stat['n'].astype(np.int64),
+                'Weighted_N': stat['sum_w'],
+                'Mean': np.where(stat['sum_w'] > 0, stat['sum_wx'] / stat['sum_w'], np.nan),
+                'Effective_N': np.where(stat['sum_w2'] > 0, stat['sum_w'] ** 2 / stat['sum_w2'], 0.0),
+            }, index=sums.index))
+    return pd.concat(rows).reset_index()
+
+def segment_scores(df, score_columns, segment_cols=None, weight_col=None):
+    """Per-segment weighted means, counts and effective N of scored columns (in memory)."""
+    segments = df[list(segment_cols)] if segment_cols else None
+    weights = df[weight_col] if weight_col else None
+    return segment_summary(segment_sums(df[score_columns], segments, weights))
+
+def stream_scores(input_path, config, output_path, chunksize=100_000, keep=None, segment_cols=None, weight_col=None):
+    """
+    Scores a CSV chunk by chunk in constant memory: only the referenced (and `keep`)
+    columns are read, and each chunk's [keep + score columns] is appended to `output_path`.
+    Segment partial sums are accumulated per chunk and merged at the end.
+    Returns (number of rows written, segment summary).
+    """
+    keep, segment_cols = list(keep or []), list(segment_cols or [])
+    plan = compile_plan(config, pd.read_csv(input_path, nrows=0).columns)
+    usecols = list(dict.fromkeys(keep + plan.input_columns + segment_cols + ([weight_col] if weight_col else [])))
+    dtypes = read_dtypes(plan, segment_cols)
+    pd.DataFrame(columns=keep + plan.output_columns).to_csv(output_path, index=False)
+    n_rows, partials = 0, []
+    for chunk in pd.read_csv(input_path, usecols=usecols, dtype=dtypes, chunksize=chunksize):
+        scores = plan.score_frame(chunk)
+        pd.concat([chunk[keep], scores], axis=1).to_csv(output_path, mode='a', header=False, index=False)
+        partials.append(segment_sums(scores, chunk[segment_cols] if segment_cols else None,
+                                     chunk[weight_col] if weight_col else None))
+        n_rows += len(chunk)
+    summary = segment_summary(merge_segment_sums(partials)) if partials else None
+    return n_rows, summary
+
 def main():
     parser = argparse.ArgumentParser(description="Survey Quantitative Analyzer")
     parser.add_argument("input", help="Input CSV file")
     parser.add_argument("config", help="Configuration JSON file")
     parser.add_argument("-o", "--output", help="Output CSV file", default="processed_output.csv")
+    parser.add_argument("--chunksize", help="Stream the input in chunks of N rows (constant memory)", type=int, default=None)
+    parser.add_argument("--keep", help="Columns copied to the streamed output (e.g. respondent id)", nargs="+", default=None)
+    parser.add_argument("--segments", help="Segment columns for the per-segment rollup (overrides config 'segments')", nargs="+", default=None)
+    parser.add_argument("--weight", help="Weight column, e.g. the raking weight (overrides config 'weight')", default=None)
+    parser.add_argument("--segments-output", help="Per-segment summary CSV (default: setup_segments.csv next to the output)", default=None)
     
     args = parser.parse_args()
     
@@ -66,10 +271,25 @@ def main():
         with open(args.config, 'r') as f:
             config = json.load(f)
             
-        df = pd.read_csv(args.input)
-        df_processed = calculate_scores(df, config)
-        df_processed.to_csv(args.output, index=False)
+        segment_cols = args.segments or config.get("segments")
+        weight_col = args.weight or config.get("weight")
+        if args.chunksize:
+            n_rows, summary = stream_scores(args.input, config, args.output, args.chunksize, args.keep, segment_cols, weight_col)
+            print(f"ℹ️ Streamed {n_rows} rows in chunks of {args.chunksize}")
+        else:
+            # Same dtypes as the streaming read, so both modes score identically
+            plan = compile_plan(config, pd.read_csv(args.input, nrows=0).columns)
+            df = pd.read_csv(args.input, dtype=read_dtypes(plan, segment_cols))
+            df_processed = calculate_scores(df, config)
+            df_processed.to_csv(args.output, index=False)
+            score_columns = plan.output_columns
+            summary = segment_scores(df_processed, score_columns, segment_cols, weight_col) if score_columns else None
         print(f"✅ Analysis complete. Processed data saved to {args.output}")
+
+        if summary is not None and (segment_cols or weight_col):
+            segments_output = args.segments_output or os.path.join(os.path.dirname(args.output), "setup_segments.csv")
+            summary.to_csv(segments_output, index=False)
+            print(f"✅ Segment summary saved to {segments_output}")
         
     except Exception as e:
         print(f"❌ Error during analysis: {e}")
@@ -1,10 +1,271 @@
 
+import os
 import pandas as pd
 import numpy as np
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import MultiLabelBinarizer
+from concurrent.futures import ProcessPoolExecutor
+from scipy import sparse
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.utils.extmath import svd_flip
 
-def run_survey_pca(df, cols, n_components=None, sep=None):
+# Multi-response tokens dropped from the dummy matrix (common junk)
+JUNK_TOKENS = ['nan', 'None', 'Outros', '']
+
+def encode_multi_response(df, cols, sep, exclude=JUNK_TOKENS):
+    """
+    Vectorized multi-response dummy encoding.
+
+    All selected columns are stacked into one Series (keyed by row position) and
+    factorized, so only distinct answer strings are split (pandas string ops) into
+    factorized tokens. The rows x answers and answers x tokens indicator matrices are
+    then multiplied into a sparse 0/1 dummy matrix, with features sorted by name.
+
+    Returns:
+        matrix: scipy CSR matrix (n_rows x n_features), int64 0/1.
+        feature_names: list of token names.
+    """
+    n_rows = len(df)
+    stacked = pd.concat([df[c].set_axis(np.arange(n_rows)) for c in cols]).dropna()
+    answer_codes, answers = pd.factorize(stacked)
+
+    tokens = pd.Series(answers.astype(str)).str.split(sep).explode().str.strip()
+    tokens = tokens[~tokens.isin(exclude)]
+    token_codes, feature_names = pd.factorize(tokens, sort=True)
+
+    row_answers = sparse.csr_matrix(
+        (np.ones(len(answer_codes), dtype=np.int64), (stacked.index.to_numpy(dtype=np.int64), answer_codes)),
+        shape=(n_rows, len(answers))
+    )
+    answer_tokens = sparse.csr_matrix(
+        (np.ones(len(token_codes), dtype=np.int64), (tokens.index.to_numpy(dtype=np.int64), token_codes)),
+        shape=(len(answers), len(feature_names))
+    )
+    matrix = (row_answers @ answer_tokens).tocsr()
+    matrix.data[:] = 1
+    return matrix, list(feature_names)
+
+def randomized_pca(X, n_components, n_oversamples=10, n_iter=7, random_state=None):
+    """
+    PCA by randomized truncated SVD of the implicitly centered matrix X - 1 mean^T.
+    X may be sparse: the centered matrix is never formed, every product is X @ Q
+    (or X.T @ Q) minus a rank-one mean correction.
+
+    Returns:
+        components: (n_components x n_features) array, signs as in sklearn PCA.
+        explained_variance_ratio: array of length n_components.
+        scores: (n_rows x n_components) array.
+    """
+    rng = np.random.default_rng(random_state)
+    n_rows, n_features = X.shape
+    mean = np.asarray(X.mean(axis=0)).ravel()
+    ones = np.ones(n_rows)
+
+    def matmul(Q):
+        return X @ Q - np.outer(ones, mean @ Q)
+
+    def rmatmul(Q):
+        return X.T @ Q - np.outer(mean, ones @ Q)
+
+    size = min(n_components + n_oversamples, n_rows, n_features)
+    Q = matmul(rng.standard_normal((n_features, size)))
+    for _ in range(n_iter):
+        Q, _ = np.linalg.qr(Q)
+        Q, _ = np.linalg.qr(rmatmul(Q))
+        Q = matmul(Q)
+    Q, _ = np.linalg.qr(Q)
+    U_small, S, Vt = np.linalg.svd(rmatmul(Q).T, full_matrices=False)
+    U, Vt = svd_flip(Q @ U_small, Vt, u_based_decision=False)
+    U, S, Vt = U[:, :n_components], S[:n_components], Vt[:n_components]
+
+    squares = X.multiply(X) if sparse.issparse(X) else X ** 2
+    total_variance = (np.asarray(squares.sum(axis=0)).ravel() - n_rows * mean ** 2).sum() / (n_rows - 1)
+    explained_variance = S ** 2 / (n_rows - 1)
+    return Vt, explained_variance / total_variance, U * S
+
+def incremental_pca(X, n_components, batch_size=None):
+    """
+    IncrementalPCA fed in row batches; sparse input is densified one batch at a time,
+    so memory is bounded by batch_size x n_features. Returns (components, ratio, scores).
+    """
+    n_rows = X.shape[0]
+    batch_size = batch_size or max(5 * X.shape[1], 1000)
+    ipca = IncrementalPCA(n_components=n_components)
+
+    # partial_fit needs at least n_components rows: a short tail joins the previous batch
+    bounds = list(range(0, n_rows, batch_size)) + [n_rows]
+    if len(bounds) > 2 and bounds[-1] - bounds[-2] < n_components:
+        del bounds[-2]
+
+    def batches():
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            batch = X[start:stop]
+            yield batch.toarray() if sparse.issparse(batch) else batch
+
+    for batch in batches():
+        ipca.partial_fit(batch)
+    scores = np.vstack([ipca.transform(batch) for batch in batches()])
+    return ipca.components_, ipca.explained_variance_ratio_, scores
+
+def gram_matrix(X, weights=None):
+    """Dense X^T diag(weights) X for a dense or sparse X."""
+    if weights is None:
+        gram = X.T @ X
+    elif sparse.issparse(X):
+        gram = X.T @ X.multiply(weights[:, None]).tocsr()
+    else:
+        gram = X.T @ (X * weights[:, None])
+    return gram.toarray() if sparse.issparse(gram) else np.asarray(gram)
+
+def correlation_from_gram(gram, n_rows, mean):
+    """Correlation matrix from the (weighted) Gram matrix, row count and column means."""
+    cov = gram / n_rows - np.outer(mean, mean)
+    std = np.sqrt(np.clip(np.diag(cov), 0, None))
+    std[std == 0] = 1
+    corr = cov / np.outer(std, std)
+    np.fill_diagonal(corr, 1)
+    return corr
+
+def permuted_gram(X, rng):
+    """Gram matrix of X with every column permuted independently (null of no correlation)."""
+    if sparse.issparse(X):
+        # A permuted sparse column is its nonzero values placed on a random subset of rows
+        X = X.tocsc()
+        n_rows = X.shape[0]
+        indices = np.concatenate([np.zeros(0, dtype=np.int64)] + [
+            rng.choice(n_rows, X.indptr[j + 1] - X.indptr[j], replace=False) for j in range(X.shape[1])
+        ])
+        return gram_matrix(sparse.csc_matrix((X.data, indices, X.indptr), shape=X.shape))
+    return gram_matrix(rng.permuted(X, axis=0))
+
+_WORKER = {}
+
+def _init_worker(X):
+    _WORKER['X'] = X
+    _WORKER['mean'] = np.asarray(X.mean(axis=0)).ravel()
+
+def _parallel_analysis_batch(task):
+    """Descending eigenvalues of `size` null correlation matrices (one batched eigvalsh)."""
+    method, size, seed = task
+    rng = np.random.default_rng(seed)
+    X, mean = _WORKER['X'], _WORKER['mean']
+    n_rows, n_features = X.shape
+    corrs = []
+    for _ in range(size):
+        if method == 'permute':
+            corrs.append(correlation_from_gram(permuted_gram(X, rng), n_rows, mean))
+        else:
+            corrs.append(np.corrcoef(rng.standard_normal((n_rows, n_features)), rowvar=False))
+    return np.linalg.eigvalsh(np.stack(corrs))[:, ::-1]
+
+def _bootstrap_batch(task):
+    """Leading unit eigenvectors of `size` bootstrap-resampled correlation matrices."""
+    n_components, size, seed = task
+    rng = np.random.default_rng(seed)
+    X = _WORKER['X']
+    n_rows = X.shape[0]
+    corrs = []
+    for _ in range(size):
+        # Resample rows as multiplicity weights instead of copying the matrix
+        weights = np.bincount(rng.integers(0, n_rows, n_rows), minlength=n_rows).astype(float)
+        mean = np.asarray(weights @ X).ravel() / n_rows
+        corrs.append(correlation_from_gram(gram_matrix(X, weights), n_rows, mean))
+    _, vectors = np.linalg.eigh(np.stack(corrs))
+    return vectors[:, :, ::-1][:, :, :n_components]
+
+def standardize_columns(X):
+    """Scales every column to unit variance (no centering, so sparse X stays sparse)."""
+    mean = np.asarray(X.mean(axis=0)).ravel()
+    squares = X.multiply(X) if sparse.issparse(X) else X ** 2
+    std = np.sqrt(np.clip(np.asarray(squares.mean(axis=0)).ravel() - mean ** 2, 0, None))
+    std[std == 0] = 1
+    return (X @ sparse.diags(1 / std)).tocsr() if sparse.issparse(X) else X / std
+
+def run_batches(task, X, settings, n_reps, batch_size, n_jobs, random_state):
+    """
+    Runs `task((*settings, size, seed))` over batches of replicates, serially or in a
+    process pool (X shipped once per worker). Seeds come from one SeedSequence, so the
+    result does not depend on n_jobs. Returns the concatenated batch outputs.
+    """
+    sizes = [min(batch_size, n_reps - start) for start in range(0, n_reps, batch_size)]
+    seeds = np.random.SeedSequence(random_state).spawn(len(sizes))
+    tasks = [(*settings, size, seed) for size, seed in zip(sizes, seeds)]
+    n_jobs = os.cpu_count() if n_jobs == -1 else (n_jobs or 1)
+    if n_jobs == 1:
+        _init_worker(X)
+        results = [task(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(X,)) as pool:
+            results = list(pool.map(task, tasks))
+    return np.concatenate(results)
+
+def parallel_analysis(X, n_iter=100, percentile=95, method='permute', batch_size=20, n_jobs=None, random_state=None):
+    """
+    Horn's parallel analysis on the correlation matrix.
+
+    Observed eigenvalues are compared with eigenvalues of `n_iter` null correlation
+    matrices, from column-permuted data ('permute') or standard normal data ('normal');
+    factors are retained while the observed eigenvalue exceeds the null `percentile`.
+
+    Returns:
+        DataFrame with Factor, Eigenvalue, Random_Mean, Random_Percentile, Retain;
+        attrs['n_factors'] holds the number of retained factors.
+    """
+    if method not in ('permute', 'normal'):
+        raise ValueError(f"Unknown method '{method}'. Use 'permute' or 'normal'.")
+    mean = np.asarray(X.mean(axis=0)).ravel()
+    observed = np.linalg.eigvalsh(correlation_from_gram(gram_matrix(X), X.shape[0], mean))[::-1]
+    null = run_batches(_parallel_analysis_batch, X, (method,), n_iter, batch_size, n_jobs, random_state)
+    threshold = np.percentile(null, percentile, axis=0)
+
+    retain = np.cumprod(observed > threshold).astype(bool)
+    result = pd.DataFrame({
+        'Factor': [f'Factor_{i+1}' for i in range(len(observed))],
+        'Eigenvalue': observed,
+        'Random_Mean': null.mean(axis=0),
+        'Random_Percentile': threshold,
+        'Retain': retain,
+    })
+    result.attrs['n_factors'] = int(retain.sum())
+    return result
+
+def bootstrap_loadings(X, n_components, feature_names=None, n_boot=200, ci=0.95, batch_size=20, n_jobs=None, random_state=None):
+    """
+    Bootstrap confidence intervals for the loadings of a correlation-matrix PCA.
+
+    `Loading` is the component coefficient, i.e. the unit eigenvector entry of the
+    correlation matrix, exactly what `run_survey_pca` returns in `loadings` for the
+    standardized data (not eigenvector * sqrt(eigenvalue)). Each replicate is an
+    eigendecomposition of a resampled correlation matrix, not a PCA refit; replicate
+    factors are sign-aligned with the full-sample loadings (largest absolute loading
+    positive, as in sklearn).
+
+    Returns:
+        Long DataFrame with Item, Factor, Loading, CI_Lower, CI_Upper.
+    """
+    n_features = X.shape[1]
+    feature_names = list(feature_names) if feature_names is not None else [f'Item_{j+1}' for j in range(n_features)]
+    mean = np.asarray(X.mean(axis=0)).ravel()
+    _, vectors = np.linalg.eigh(correlation_from_gram(gram_matrix(X), X.shape[0], mean))
+    reference = vectors[:, ::-1][:, :n_components]
+    # Same sign convention as sklearn PCA: the largest absolute loading is positive
+    reference *= np.sign(reference[np.argmax(np.abs(reference), axis=0), np.arange(reference.shape[1])])
+
+    boot = run_batches(_bootstrap_batch, X, (n_components,), n_boot, batch_size, n_jobs, random_state)
+    signs = np.sign(np.einsum('bpk,pk->bk', boot, reference))
+    signs[signs == 0] = 1
+    boot *= signs[:, None, :]
+    lower, upper = np.percentile(boot, [(1 - ci) / 2 * 100, (1 + ci) / 2 * 100], axis=0)
+
+    factors = [f'Factor_{i+1}' for i in range(n_components)]
+    return pd.DataFrame({
+        'Item': np.repeat(feature_names, n_components),
+        'Factor': np.tile(factors, n_features),
+        'Loading': reference.ravel(),
+        'CI_Lower': lower.ravel(),
+        'CI_Upper': upper.ravel(),
+    })
+
+def run_survey_pca(df, cols, n_components=None, sep=None, method='full', batch_size=None, random_state=None,
+                   n_iter=100, n_boot=0, n_jobs=None):
     """
     Performs PCA tailored for Survey Data, handling Multi-Response questions.
     
@@ -13,70 +274,88 @@ def run_survey_pca(df, cols, n_components=None, sep=None):
         cols: List of columns to analyze. 
               If 'sep' is provided, columns are treated as strings to be split (e.g. "A;B;C").
               If 'sep' is None, columns are treated as separate binary/likert variables.
-        n_components: Number of components to extract. If None, uses Kaiser criterion (approx).
+        n_components: Number of components to extract. If None, uses Horn's parallel analysis.
+              Parallel analysis and bootstrap CIs work on the correlation matrix, so when
+              either runs the columns are standardized first and the returned factors are
+              those of the correlation PCA (otherwise PCA runs on the raw covariance).
         sep: Separator for multi-response string columns (optional).
+        method: 'full' (dense sklearn PCA), 'sparse' (randomized truncated SVD on the
+                implicitly centered, possibly sparse, matrix) or 'incremental'
+                (IncrementalPCA over row batches of `batch_size`).
+        batch_size: Rows per batch for method='incremental'.
+        random_state: Seed for method='sparse', parallel analysis and bootstrap.
+        n_iter: Null replicates for parallel analysis (when n_components is None).
+        n_boot: Bootstrap replicates for loading CIs (0 = skip).
+        n_jobs: Worker processes for parallel analysis / bootstrap (-1 = all cores).
         
     Returns:
         loadings: DataFrame of factor loadings.
         scores: DataFrame of factor scores for each respondent.
         variance: Explained variance ratio.
+        variance.attrs['matrix'] is 'correlation' or 'covariance'; variance.attrs['parallel_analysis']
+        holds the parallel analysis table (if run) and loadings.attrs['bootstrap_ci'] the
+        bootstrap CIs of the same loadings (if n_boot > 0).
     """
     
     # 1. Preprocessing
     if sep:
         # Multi-Response Case (e.g., one or few columns with "ItemA;ItemB")
         # We need to create dummies first
-        dummies_list = []
-        for idx, row in df.iterrows():
-            # Combine all text from specified columns
-            combined_text = []
-            for c in cols:
-                val = str(row[c])
-                if val != 'nan' and val.strip() != '':
-                    combined_text.extend([x.strip() for x in val.split(sep)])
-            dummies_list.append(combined_text)
-            
-        mlb = MultiLabelBinarizer()
-        data_matrix = mlb.fit_transform(dummies_list)
-        feature_names = mlb.classes_
-        
-        # Filter out common junk
-        valid_indices = [i for i, name in enumerate(feature_names) if name not in ['nan', 'None', 'Outros', '']]
-        data_matrix = data_matrix[:, valid_indices]
-        feature_names = [feature_names[i] for i in valid_indices]
-        
-        X = pd.DataFrame(data_matrix, columns=feature_names, index=df.index)
+        data_matrix, feature_names = encode_multi_response(df, cols, sep)
+        # Only the dense solver needs the dense dummy matrix
+        X = data_matrix.toarray() if method == 'full' else data_matrix.astype(float)
+        index = df.index
         
     else:
         # Standard Case (Likert or Binary columns)
-        X = df[cols].dropna()
+        X_df = df[cols].dropna()
+        X, feature_names, index = X_df.to_numpy(dtype=float), X_df.columns, X_df.index
+    
+    # PA and bootstrap are defined on the correlation matrix: decompose the same matrix
+    use_correlation = n_components is None or bool(n_boot)
+    if use_correlation:
+        X = standardize_columns(X)
     
     # 2. PCA
+    pa = None
     if n_components is None:
-        n_components = min(len(X.columns), 5) # Default/Safe cap if untuned
+        pa = parallel_analysis(X, n_iter=n_iter, n_jobs=n_jobs, random_state=random_state)
+        n_components = max(pa.attrs['n_factors'], 1)
         
-    pca = PCA(n_components=n_components)
-    scores = pca.fit_transform(X)
-    
-    # 3. Validating n_components (simple heuristic)
-    # If generic usage, just trust input or default
+    if method == 'full':
+        pca = PCA(n_components=n_components)
+        scores = pca.fit_transform(X)
+        components, explained_ratio = pca.components_, pca.explained_variance_ratio_
+    elif method == 'sparse':
+        components, explained_ratio, scores = randomized_pca(X, n_components, random_state=random_state)
+    elif method == 'incremental':
+        components, explained_ratio, scores = incremental_pca(X, n_components, batch_size)
+    else:
+        raise ValueError(f"Unknown method '{method}'. Use 'full', 'sparse' or 'incremental'.")
     
-    # 4. Outputs
+    # 3. Outputs
     loadings = pd.DataFrame(
-        pca.components_.T, 
+        components.T, 
         columns=[f'Factor_{i+1}' for i in range(n_components)],
-        index=X.columns
+        index=feature_names
     )
     
     scores_df = pd.DataFrame(
         scores, 
         columns=[f'Factor_{i+1}' for i in range(n_components)],
-        index=X.index
+        index=index
     )
     
     variance_df = pd.DataFrame({
         'Factor': [f'Factor_{i+1}' for i in range(n_components)],
-        'Explained_Variance': pca.explained_variance_ratio_
+        'Explained_Variance': explained_ratio
     })
+    variance_df.attrs['matrix'] = 'correlation' if use_correlation else 'covariance'
+    if pa is not None:
+        variance_df.attrs['parallel_analysis'] = pa
+    if n_boot:
+        loadings.attrs['bootstrap_ci'] = bootstrap_loadings(
+            X, n_components, feature_names, n_boot=n_boot, n_jobs=n_jobs, random_state=random_state
+        )
     
     return loadings, scores_df, variance_df
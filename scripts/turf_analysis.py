@@ -1,52 +1,490 @@
 
+import os
+import time
+import heapq
 import pandas as pd
 import numpy as np
-from itertools import combinations
+from math import comb
+from itertools import combinations, islice, chain
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 
-def run_turf_analysis(df, items, n_max_size=4):
+# Bytes of packed respondent bits held per batch of combinations (~32 MB)
+BATCH_BYTES = 1 << 25
+
+_BYTE_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(words):
+    """Counts set bits along the last axis of a uint64 array."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    return _BYTE_POPCOUNT[words.view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+
+def reach_function(n_words, weights=None):
+    """
+    Builds the reach measure for packed bitsets of `n_words` words.
+
+    Unweighted reach is a popcount. Weighted reach looks every byte up in a
+    (n_bytes, 256) table of precomputed weight sums, so arbitrary respondent
+    weights stay exact without unpacking the bits.
+
+    Args:
+        n_words: Number of uint64 words per bitset.
+        weights: Optional per-respondent weights.
+
+    Returns:
+        Function mapping a (..., n_words) uint64 array to the reach of each row.
+    """
+    if weights is None:
+        return popcount
+
+    n_bytes = n_words * 8
+    padded = np.zeros(n_bytes * 8)
+    padded[:len(weights)] = weights
+    bit_masks = (np.arange(256)[None, :] >> np.arange(8)[:, None]) & 1
+    table = (padded.reshape(n_bytes, 8) @ bit_masks).ravel()
+    offsets = np.arange(n_bytes) * 256
+
+    def weighted_reach(words):
+        return table[words.view(np.uint8) + offsets].sum(axis=-1)
+
+    return weighted_reach
+
+
+def pack_items(data):
+    """
+    Packs a respondents x items reach matrix into one uint64 bitset per item.
+
+    Args:
+        data: 2D array-like (n_respondents, n_items), truthy where the item reaches the respondent.
+
+    Returns:
+        uint64 array of shape (n_items, n_words), bit r of item i set if respondent r is reached.
+    """
+    bits = np.asarray(data, dtype=bool).T
+    n_items, n_respondents = bits.shape
+    n_words = max(1, -(-n_respondents // 64))
+    padded = np.zeros((n_items, n_words * 64), dtype=bool)
+    padded[:, :n_respondents] = bits
+    return np.packbits(padded, axis=1, bitorder='little').view(np.uint64)
+
+
+def unrank_combination(rank, n_items, size):
+    """Returns the `rank`-th (0-based) size-combination of range(n_items) in lexicographic order."""
+    combo = []
+    x = 0
+    for remaining in range(size, 0, -1):
+        while comb(n_items - x - 1, remaining - 1) <= rank:
+            rank -= comb(n_items - x - 1, remaining - 1)
+            x += 1
+        combo.append(x)
+        x += 1
+    return tuple(combo)
+
+
+def combinations_from(first, n_items):
+    """Lexicographic successors of combination `first` (inclusive), built from itertools blocks."""
+    size = len(first)
+    for level in range(size - 1, -1, -1):
+        prefix = first[:level]
+        lo = first[level] if level == size - 1 else first[level] + 1
+        for x in range(lo, n_items):
+            for rest in combinations(range(x + 1, n_items), size - level - 1):
+                yield prefix + (x,) + rest
+
+
+def combination_batches(n_items, size, batch_size, start=0, stop=None):
+    """
+    Yields size-combinations of range(n_items) with lexicographic rank in [start, stop),
+    in order, as (batch, size) index arrays.
+    """
+    total = comb(n_items, size)
+    stop = total if stop is None else min(stop, total)
+    if start >= stop:
+        return
+    it = combinations(range(n_items), size) if start == 0 else combinations_from(unrank_combination(start, n_items, size), n_items)
+    it = islice(it, stop - start)
+    while True:
+        flat = np.fromiter(chain.from_iterable(islice(it, batch_size)), dtype=np.intp)
+        if flat.size == 0:
+            return
+        yield flat.reshape(-1, size)
+
+
+def batch_reach(packed, combos, reach_fn=popcount):
+    """Unduplicated reach of each combination row: OR of item bitsets, then `reach_fn`."""
+    acc = packed[combos[:, 0]]
+    for j in range(1, combos.shape[1]):
+        acc |= packed[combos[:, j]]
+    return reach_fn(acc)
+
+
+def marginal_gains(packed, acc, reach_fn=popcount):
+    """Reach each item would add on top of the respondents already covered by `acc`."""
+    return reach_fn(packed & ~acc)
+
+
+def push_top_k(heap, k, reach, combo):
+    """
+    Offers a portfolio to a bounded min-heap of the `k` best.
+
+    Ties on reach favour the lexicographically smaller combination, matching
+    the order in which the exhaustive solver meets them.
+    """
+    entry = (reach, tuple(-j for j in combo), combo)
+    if len(heap) < k:
+        heapq.heappush(heap, entry)
+    elif entry[:2] > heap[0][:2]:
+        heapq.heapreplace(heap, entry)
+
+
+def ranked_portfolios(heap):
+    """Heap contents as a best-first list of (reach, combo)."""
+    return [(reach, combo) for reach, _, combo in sorted(heap, reverse=True)]
+
+
+def reach_upper_bound(packed, combo, size, reach_fn=popcount):
+    """
+    Upper bound on the best reach of any size-`size` portfolio.
+
+    Reach is submodular, so OPT <= f(S) + sum of the `size` largest marginal gains over S.
+    """
+    acc = np.bitwise_or.reduce(packed[list(combo)], axis=0)
+    gains = marginal_gains(packed, acc, reach_fn)
+    gains[list(combo)] = 0
+    return reach_fn(acc) + np.sort(gains)[::-1][:size].sum()
+
+
+def ladder_bounds(packed, portfolios, n_max_size, reach_fn=popcount):
+    """
+    Upper bounds on the best reach of every size 1..n_max_size.
+
+    The submodular bound f(S) + sum of the k largest gains over S holds for any set S,
+    so each size takes the minimum over the empty set and all given `portfolios`
+    (e.g. the greedy prefixes). The empty set alone makes the size-1 bound exact.
+    """
+    n_items, n_words = packed.shape
+    bounds = np.full(n_max_size, np.inf)
+    for combo in [()] + list(portfolios):
+        acc = np.bitwise_or.reduce(packed[list(combo)], axis=0) if combo else np.zeros(n_words, dtype=np.uint64)
+        gains = marginal_gains(packed, acc, reach_fn).astype(float)
+        gains[list(combo)] = 0
+        top = np.cumsum(np.sort(gains)[::-1][:n_max_size])
+        top = np.concatenate([top, np.full(n_max_size - len(top), top[-1] if len(top) else 0.0)])
+        bounds = np.minimum(bounds, reach_fn(acc) + top)
+    return bounds
+
+
+def top_k_in_range(packed, size, start, stop, batch_size, reach_fn=popcount, top_k=1):
+    """Top-k heap and number of combinations evaluated over the rank range [start, stop)."""
+    heap = []
+    n_evaluated = 0
+    for combos in combination_batches(packed.shape[0], size, batch_size, start, stop):
+        reach = batch_reach(packed, combos, reach_fn)
+        n_evaluated += len(combos)
+
+        # Only rows that can enter the heap: at least the batch's k-th best and the heap minimum
+        threshold = heap[0][0] if len(heap) == top_k else -np.inf
+        if len(reach) > top_k:
+            threshold = max(threshold, np.partition(reach, len(reach) - top_k)[len(reach) - top_k])
+        for i in np.flatnonzero(reach >= threshold):
+            push_top_k(heap, top_k, reach[i].item(), tuple(int(j) for j in combos[i]))
+    return heap, n_evaluated
+
+
+def solve_exhaustive(packed, n_max_size, batch_size, reach_fn=popcount, top_k=1):
+    """Evaluates every combination, keeping the `top_k` best per size."""
+    solutions = []
+    for size in range(1, n_max_size + 1):
+        heap, n_evaluated = top_k_in_range(packed, size, 0, None, batch_size, reach_fn, top_k)
+        portfolios = ranked_portfolios(heap)
+        solutions.append({'portfolios': portfolios, 'bound': portfolios[0][0], 'evaluated': n_evaluated})
+    return solutions
+
+
+_WORKER = {}
+
+
+def _init_worker(shm_name, shape, weights):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _WORKER['shm'] = shm
+    _WORKER['packed'] = np.ndarray(shape, dtype=np.uint64, buffer=shm.buf)
+    _WORKER['reach_fn'] = reach_function(shape[1], weights)
+
+
+def _worker_range(size, start, stop, batch_size, top_k):
+    heap, n_evaluated = top_k_in_range(_WORKER['packed'], size, start, stop, batch_size, _WORKER['reach_fn'], top_k)
+    return [(reach, combo) for reach, _, combo in heap], n_evaluated
+
+
+def solve_exhaustive_parallel(packed, n_max_size, batch_size, weights=None, top_k=1, n_jobs=-1, chunks_per_job=4):
+    """
+    Exhaustive solver spread over a process pool.
+
+    Each size's combination space is cut into contiguous lexicographic rank ranges;
+    workers read the packed item matrix from shared memory and return their local
+    top-k. Merging uses the same total order as `push_top_k`, so the result does not
+    depend on worker scheduling.
+    """
+    n_jobs = os.cpu_count() if n_jobs in (None, -1) else n_jobs
+    n_items = packed.shape[0]
+    shm = shared_memory.SharedMemory(create=True, size=packed.nbytes)
+    try:
+        np.ndarray(packed.shape, dtype=np.uint64, buffer=shm.buf)[:] = packed
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(shm.name, packed.shape, weights)) as pool:
+            futures = []
+            for size in range(1, n_max_size + 1):
+                total = comb(n_items, size)
+                n_chunks = max(1, min(total, n_jobs * chunks_per_job))
+                bounds = [total * c // n_chunks for c in range(n_chunks + 1)]
+                futures.append([pool.submit(_worker_range, size, lo, hi, batch_size, top_k)
+                                for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo])
+
+            solutions = []
+            for size_futures in futures:
+                heap = []
+                n_evaluated = 0
+                for future in size_futures:
+                    portfolios, evaluated = future.result()
+                    n_evaluated += evaluated
+                    for reach, combo in portfolios:
+                        push_top_k(heap, top_k, reach, combo)
+                portfolios = ranked_portfolios(heap)
+                solutions.append({'portfolios': portfolios, 'bound': portfolios[0][0], 'evaluated': n_evaluated})
+    finally:
+        shm.close()
+        shm.unlink()
+    return solutions
+
+
+def solve_greedy(packed, n_max_size, reach_fn=popcount, top_k=1):
+    """
+    Incremental greedy: each size adds the item with the largest marginal reach to the previous portfolio.
+
+    Ranks 2..top_k of a size are the runner-up items for that step.
+    """
+    acc = np.zeros(packed.shape[1], dtype=np.uint64)
+    base = 0
+    chosen = []
+    solutions = []
+    for size in range(1, n_max_size + 1):
+        gains = marginal_gains(packed, acc, reach_fn)
+        gains[chosen] = -1
+        order = np.argsort(-gains, kind='stable')[:min(top_k, packed.shape[0] - len(chosen))]
+        portfolios = [(base + gains[j].item(), tuple(sorted(chosen + [int(j)]))) for j in order]
+
+        chosen.append(int(order[0]))
+        acc |= packed[order[0]]
+        base = portfolios[0][0]
+        solutions.append({
+            'portfolios': portfolios,
+            'evaluated': packed.shape[0] - size + 1,
+        })
+
+    # Online bound: the tightest submodular bound over all greedy prefixes
+    bounds = ladder_bounds(packed, [sol['portfolios'][0][1] for sol in solutions], n_max_size, reach_fn)
+    for sol, bound in zip(solutions, bounds):
+        sol['bound'] = bound.item()
+    return solutions
+
+
+def solve_beam(packed, n_max_size, beam_width, reach_fn=popcount, top_k=1):
+    """Beam search: keeps the `beam_width` best portfolios of each size and extends each by one item."""
+    n_items, n_words = packed.shape
+    beam = [(np.zeros(n_words, dtype=np.uint64), ())]
+    solutions = []
+    for size in range(1, n_max_size + 1):
+        candidates = {}
+        for acc, combo in beam:
+            base = reach_fn(acc).item()
+            gains = marginal_gains(packed, acc, reach_fn)
+            for j in range(n_items):
+                if j in combo:
+                    continue
+                child = tuple(sorted(combo + (j,)))
+                if child not in candidates:
+                    candidates[child] = base + gains[j].item()
+
+        ranked = sorted(candidates.items(), key=lambda kv: (-kv[1], kv[0]))[:max(beam_width, top_k)]
+        beam = [(np.bitwise_or.reduce(packed[list(combo)], axis=0), combo) for combo, _ in ranked[:beam_width]]
+        solutions.append({
+            'portfolios': [(reach, combo) for combo, reach in ranked[:top_k]],
+            'evaluated': len(candidates),
+        })
+
+    bounds = ladder_bounds(packed, [sol['portfolios'][0][1] for sol in solutions], n_max_size, reach_fn)
+    for sol, bound in zip(solutions, bounds):
+        sol['bound'] = bound.item()
+    return solutions
+
+
+def solve_branch_and_bound(packed, n_max_size, max_nodes=None, reach_fn=popcount, top_k=1):
+    """
+    Exact search per size, seeded with the greedy solution.
+
+    A partial portfolio is pruned when its reach plus the largest marginal gains of the
+    remaining candidates cannot beat the k-th best portfolio found so far. If `max_nodes`
+    is exhausted the incumbents are returned with their submodular upper bound.
+    """
+    n_items, n_words = packed.shape
+    greedy = solve_greedy(packed, n_max_size, reach_fn)
+    solutions = []
+
+    for size in range(1, n_max_size + 1):
+        heap = []
+        seed = greedy[size - 1]['portfolios'][0]
+        push_top_k(heap, top_k, *seed)
+        nodes = [0]
+        aborted = [False]
+
+        def incumbent():
+            return heap[0][0] if len(heap) == top_k else -np.inf
+
+        def search(acc, reach, chosen, candidates):
+            if aborted[0]:
+                return
+            nodes[0] += 1
+            if max_nodes is not None and nodes[0] > max_nodes:
+                aborted[0] = True
+                return
+            remaining = size - len(chosen)
+            gains = marginal_gains(packed[candidates], acc, reach_fn)
+            order = np.argsort(-gains, kind='stable')
+            candidates, gains = candidates[order], gains[order]
+
+            # Children are drawn from the suffix candidates[i:], sorted by gain, so the
+            # sum of its first `remaining` gains bounds every portfolio below that child.
+            # Ties are kept: an equal reach can still win the lexicographic tie-break.
+            for i in range(len(candidates) - remaining + 1):
+                if reach + gains[i:i + remaining].sum() < incumbent():
+                    break
+                j = int(candidates[i])
+                if remaining == 1:
+                    combo = tuple(sorted(chosen + [j]))
+                    if combo != seed[1]:
+                        push_top_k(heap, top_k, reach + gains[i].item(), combo)
+                    continue
+                search(acc | packed[j], reach + gains[i].item(), chosen + [j], candidates[i + 1:])
+
+        search(np.zeros(n_words, dtype=np.uint64), 0, [], np.arange(n_items))
+        portfolios = ranked_portfolios(heap)
+        bound = min(greedy[size - 1]['bound'], reach_upper_bound(packed, portfolios[0][1], size, reach_fn)) \
+            if aborted[0] else portfolios[0][0]
+        solutions.append({'portfolios': portfolios, 'bound': bound, 'evaluated': nodes[0]})
+    return solutions
+
+
+SOLVERS = ('exhaustive', 'greedy', 'beam', 'bnb')
+
+
+def run_turf_analysis(df, items, n_max_size=4, batch_size=None, solver='exhaustive', beam_width=10,
+                      max_nodes=None, weight_col=None, top_k=1, n_jobs=None):
     """
     Performs TURF Analysis (Total Unduplicated Reach and Frequency).
-    
+
+    Each item is packed once into a uint64 bitset over respondents; reach of a
+    combination is the (weighted) reach of the OR of its bitsets.
+
     Args:
         df: DataFrame containing the data (binary 0/1 or boolean).
         items: List of column names to include in the analysis.
         n_max_size: Maximum size of combination to check (default 4).
-        
+        batch_size: Combinations evaluated per vectorized batch (default sized to ~32 MB).
+        solver: 'exhaustive' (all combinations), 'greedy' (incremental marginal reach),
+                'beam' (beam search of `beam_width`) or 'bnb' (exact branch-and-bound).
+        beam_width: Portfolios kept per size by the beam solver.
+        max_nodes: Optional node budget per size for the branch-and-bound solver.
+        weight_col: Optional column of respondent weights (e.g. 'weight' from raking).
+        top_k: Number of ranked portfolios reported per size.
+        n_jobs: Worker processes for the exhaustive solver (None or 1 = serial, -1 = all cores).
+
     Returns:
-        DataFrame with columns ['Size', 'Combination', 'Reach', 'Reach_Percent']
+        TURF ladder DataFrame with columns ['Size', 'Rank', 'Combination', 'Reach_Count',
+        'Reach_Percent', 'Frequency', 'Solver', 'Optimality_Gap']. Reach_Count is the
+        weighted base when `weight_col` is given. Frequency is the average number of
+        portfolio items reaching each reached respondent. Optimality_Gap is the upper bound
+        on the best achievable reach of that size minus the best Reach_Percent found, in
+        percentage points (0 when proven optimal).
+        Timing stats are available in `result.attrs['stats']`.
     """
+    if solver not in SOLVERS:
+        raise ValueError(f"Unknown TURF solver '{solver}'. Expected one of {SOLVERS}.")
+
+    started = time.perf_counter()
+
     # Filter valid items
     valid_items = [col for col in items if col in df.columns]
-    
-    # Create binary matrix (force 0/1)
+
+    weights = None
+    if weight_col is not None:
+        if weight_col in df.columns:
+            weights = df[weight_col].fillna(0).to_numpy(dtype=float)
+        else:
+            print(f"Warning: {weight_col} not found. Using unweighted reach.")
+
     # Assumes NaNs are 0 (not reached) if data is sparse
-    data = df[valid_items].fillna(0).astype(bool).astype(int)
+    packed = pack_items(df[valid_items].fillna(0).to_numpy())
     n_respondents = len(df)
-    
+    n_words = packed.shape[1]
+    n_max_size = min(n_max_size, len(valid_items))
+    reach_fn = reach_function(n_words, weights)
+    base = weights.sum() if weights is not None else n_respondents
+
+    if batch_size is None:
+        # The weighted lookup materializes 8-byte indices per packed byte
+        bytes_per_combo = 8 * n_words * (8 if weights is not None else 1)
+        batch_size = max(1, BATCH_BYTES // bytes_per_combo)
+
+    stats = {
+        'engine': 'bitset',
+        'solver': solver,
+        'weighted': weights is not None,
+        'n_jobs': n_jobs if solver == 'exhaustive' else None,
+        'n_items': len(valid_items),
+        'n_respondents': n_respondents,
+        'n_words': n_words,
+        'pack_seconds': time.perf_counter() - started,
+    }
+
+    solve_started = time.perf_counter()
+    if solver == 'exhaustive' and n_jobs not in (None, 1):
+        solutions = solve_exhaustive_parallel(packed, n_max_size, batch_size, weights, top_k, n_jobs)
+    elif solver == 'exhaustive':
+        solutions = solve_exhaustive(packed, n_max_size, batch_size, reach_fn, top_k)
+    elif solver == 'greedy':
+        solutions = solve_greedy(packed, n_max_size, reach_fn, top_k)
+    elif solver == 'beam':
+        solutions = solve_beam(packed, n_max_size, beam_width, reach_fn, top_k)
+    else:
+        solutions = solve_branch_and_bound(packed, n_max_size, max_nodes, reach_fn, top_k)
+    stats['solve_seconds'] = time.perf_counter() - solve_started
+
+    item_reach = reach_fn(packed)
+
+    def to_pct(value):
+        return round(value / base * 100, 2) if base else 0.0
+
     results = []
-    
-    for size in range(1, n_max_size + 1):
-        best_reach = -1
-        best_combo = None
-        
-        # Check all combinations
-        for combo in combinations(valid_items, size):
-            # Calculate reach: user is reached if sum across combo columns > 0
-            # Faster numpy implementation
-            sub_matrix = data[list(combo)].values
-            # Check if ANY item in row is 1
-            reached_count = np.any(sub_matrix, axis=1).sum()
-            reach_pct = reached_count / n_respondents
-            
-            if reach_pct > best_reach:
-                best_reach = reach_pct
-                best_combo = combo
-        
-        results.append({
-            'Size': size,
-            'Combination': ", ".join(best_combo),
-            'Reach_Count': int(best_reach * n_respondents),
-            'Reach_Percent': round(best_reach * 100, 2)
-        })
-        
-    return pd.DataFrame(results)
+    for size, sol in enumerate(solutions, start=1):
+        best_reach = sol['portfolios'][0][0]
+        gap = round(to_pct(min(sol['bound'], base)) - to_pct(best_reach), 2)
+        for rank, (reach, combo) in enumerate(sol['portfolios'], start=1):
+            results.append({
+                'Size': size,
+                'Rank': rank,
+                'Combination': ", ".join(valid_items[j] for j in combo),
+                'Reach_Count': reach if weights is None else round(reach, 2),
+                'Reach_Percent': to_pct(reach),
+                'Frequency': round(item_reach[list(combo)].sum().item() / reach, 2) if reach else 0.0,
+                'Solver': solver,
+                'Optimality_Gap': gap,
+            })
+    stats['evaluated'] = [sol['evaluated'] for sol in solutions]
+    stats['total_seconds'] = time.perf_counter() - started
+
+    result = pd.DataFrame(results)
+    result.attrs['stats'] = stats
+    return result
@@ -1,59 +1,528 @@
 
 import pandas as pd
 import numpy as np
+import os
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
 
-def rake_weights(df, target_distributions, max_iter=100, tolerance=0.001):
+def normalize_targets(target_distributions):
+    """Returns a copy of the targets with each variable's proportions summing to 1."""
+    normalized = {}
+    for col, targets in target_distributions.items():
+        total = sum(targets.values())
+        if abs(total - 1.0) > 0.01:
+            print(f"Warning: Target proportions for '{col}' sum to {total}, not 1.0. Normalizing.")
+            targets = {k: v/total for k,v in targets.items()}
+        normalized[col] = dict(targets)
+    return normalized
+
+def encode_margins(df, target_distributions):
+    """
+    Factorizes each weighting variable to integer codes once.
+
+    Args:
+        df: Pandas DataFrame containing the sample data.
+        target_distributions: Normalized {column: {category: target_proportion}}.
+
+    Returns:
+        List of (col, codes, targets) where `codes` maps each row to a category slot
+        (missing values go to the last slot) and `targets` holds the target proportion
+        per slot, NaN for sample categories without a target.
+    """
+    margins = []
+    for col, targets in target_distributions.items():
+        codes, uniques = pd.factorize(df[col])
+        n_categories = len(uniques)
+        codes = np.where(codes < 0, n_categories, codes)
+
+        target_vec = np.full(n_categories + 1, np.nan)
+        positions = pd.Index(uniques).get_indexer(list(targets.keys()))
+        for (category, target_prop), pos in zip(targets.items(), positions):
+            if pos < 0:
+                print(f"Warning: Category '{category}' in targets missing from sample column '{col}'.")
+            else:
+                target_vec[pos] = target_prop
+        margins.append((col, codes, target_vec))
+    return margins
+
+def ipf_step(weights, codes, target_vec):
+    """
+    Adjusts `weights` in place to one margin: bincount the current totals per
+    category, then gather-multiply each row by its category factor.
+    """
+    counts = np.bincount(codes, weights=weights, minlength=len(target_vec))
+    counts[-1] = 0.0
+    total = counts.sum()
+    current_prop = counts / total if total > 0 else counts
+    factors = np.ones(len(target_vec))
+    adjust = ~np.isnan(target_vec) & (current_prop > 0)
+    factors[adjust] = target_vec[adjust] / current_prop[adjust]
+    weights *= factors[codes]
+    return weights
+
+def trim_bounds(weights, trim):
+    """Absolute (floor, cap) clip bounds: `trim` multiples of the mean non-zero starting weight."""
+    if trim is None:
+        return None
+    mean_weight = weights[weights > 0].mean()
+    return (trim[0] * mean_weight, trim[1] * mean_weight)
+
+def ipf_sweep(weights, margins, bounds=None):
+    """
+    One IPF pass over every margin, then optional clipping of the non-zero weights
+    to the absolute `bounds` (see `trim_bounds`). The trimmed mass is redistributed
+    over the unclipped weights so the total is unchanged; bounds are fixed for the
+    whole run, so repeated sweeps cannot shrink the weights.
+
+    Returns:
+        Number of weights clipped in this sweep.
+    """
+    for _, codes, target_vec in margins:
+        ipf_step(weights, codes, target_vec)
+
+    if bounds is None:
+        return 0
+    active = weights > 0
+    original = weights[active]
+    total = original.sum()
+    clipped = np.clip(original, bounds[0], bounds[1])
+    n_trimmed = int((clipped != original).sum())
+    # Redistribute the trimmed mass over the weights still inside the bounds
+    for _ in range(20):
+        gap = total - clipped.sum()
+        free = (clipped > bounds[0]) & (clipped < bounds[1])
+        if abs(gap) <= 1e-9 * total or not free.any():
+            break
+        clipped[free] *= 1 + gap / clipped[free].sum()
+        clipped = np.clip(clipped, bounds[0], bounds[1])
+    weights[active] = clipped
+    return n_trimmed
+
+def marginal_error(weights, codes, target_vec):
+    """Largest absolute gap between weighted and target proportions on one margin."""
+    counts = np.bincount(codes, weights=weights, minlength=len(target_vec))[:-1]
+    total = counts.sum()
+    if total <= 0:
+        return np.nan
+    targeted = ~np.isnan(target_vec[:-1])
+    return np.abs(counts[targeted] / total - target_vec[:-1][targeted]).max(initial=0.0)
+
+def kish_design_effect(weights):
+    """Kish approximate design effect due to weighting: n * sum(w^2) / sum(w)^2."""
+    weights = np.asarray(weights, dtype=float)
+    return len(weights) * np.square(weights).sum() / weights.sum() ** 2
+
+# Sweeps without marginal-error improvement before trimmed raking gives up
+TRIM_PATIENCE = 10
+# Max marginal error accepted when trimmed weights settle
+TRIM_MARGIN_TOLERANCE = 0.001
+
+@dataclass
+class RakingResult:
+    """
+    Raked weights plus convergence and weighting-efficiency diagnostics.
+
+    `n_trimmed` counts weights clipped to `trim_bounds` in the final sweep.
+    """
+    weights: pd.Series
+    converged: bool
+    iterations: int
+    history: pd.DataFrame
+    design_effect: float
+    effective_n: float
+    min_weight: float
+    max_weight: float
+    trim_bounds: tuple = None
+    n_trimmed: int = 0
+    margin_errors: dict = field(default_factory=dict)
+
+def rake(df, target_distributions, max_iter=100, tolerance=0.001, trim=None, base_weights=None):
+    """
+    Rakes weights and reports diagnostics computed inside the IPF loop.
+
+    Args:
+        df: Pandas DataFrame containing the sample data.
+        target_distributions: {column: {category: target_proportion}}, as in `rake_weights`.
+        max_iter: Max iterations.
+        tolerance: Convergence threshold on the total absolute weight change per iteration.
+        trim: Optional (floor, cap) as multiples of the mean starting weight. Weights are
+              clipped after every IPF sweep (total kept) and re-raked until they stop
+              changing. If the bounds cannot be met together with the margins, raking
+              stops once the marginal error stalls, with a warning.
+        base_weights: Optional starting weights (default 1.0). Zero weights stay zero.
+
+    Returns:
+        RakingResult with the weights Series, per-iteration history (max marginal error
+        and weight change), Kish design effect, effective sample size, min/max weight
+        and the final max marginal error per variable.
+    """
+    target_distributions = normalize_targets(target_distributions)
+    margins = encode_margins(df, target_distributions)
+
+    # Initialize weights to 1.0
+    weights = np.ones(len(df)) if base_weights is None else np.array(base_weights, dtype=float)
+    history = []
+    converged = False
+    bounds = trim_bounds(weights, trim)
+    n_trimmed = 0
+    best_error, stalled = np.inf, 0
+
+    for i in range(max_iter):
+        old_weights = weights.copy()
+        n_trimmed = ipf_sweep(weights, margins, bounds)
+
+        weight_diff = np.abs(weights - old_weights).sum()
+        max_error = max((marginal_error(weights, codes, target_vec) for _, codes, target_vec in margins), default=0.0)
+        history.append({'iteration': i + 1, 'max_marginal_error': max_error, 'weight_change': weight_diff})
+
+        # Check convergence (with trimming, weights can also settle with the margins unmet)
+        if weight_diff < tolerance:
+            converged = bounds is None or max_error <= TRIM_MARGIN_TOLERANCE
+            break
+
+        # Trimming fights the margins: stop once the marginal error no longer improves
+        if bounds is not None:
+            if max_error < best_error - 1e-6 or max_error < 1e-6:
+                best_error, stalled = min(best_error, max_error), 0
+            else:
+                stalled += 1
+            if stalled >= TRIM_PATIENCE:
+                break
+
+    if bounds is not None and not converged and history:
+        print(f"Warning: Trim bounds {trim} cannot be met together with the margins "
+              f"(max marginal error {history[-1]['max_marginal_error']:.4f} after {len(history)} iterations). "
+              f"Widen the bounds or relax the targets.")
+
+    ess = weights.sum() ** 2 / np.square(weights).sum() if len(weights) else 0.0
+    return RakingResult(
+        weights=pd.Series(weights, index=df.index, name='weight'),
+        converged=converged,
+        iterations=len(history),
+        history=pd.DataFrame(history, columns=['iteration', 'max_marginal_error', 'weight_change']),
+        design_effect=kish_design_effect(weights) if len(weights) else np.nan,
+        effective_n=ess,
+        min_weight=weights.min() if len(weights) else np.nan,
+        max_weight=weights.max() if len(weights) else np.nan,
+        trim_bounds=bounds,
+        n_trimmed=n_trimmed,
+        margin_errors={col: marginal_error(weights, codes, target_vec) for col, codes, target_vec in margins},
+    )
+
+def rake_weights(df, target_distributions, max_iter=100, tolerance=0.001, trim=None):
     """
     Calculates weights using the Raking (Iterative Proportional Fitting) method.
-    
+
+    Each weighting variable is factorized to integer codes once; every IPF step
+    is a `np.bincount` of current weights plus a gather-multiply. Use `rake` for
+    the full diagnostics.
+
     Args:
         df: Pandas DataFrame containing the sample data.
-        target_distributions: Dictionary where keys are column names and values are 
+        target_distributions: Dictionary where keys are column names and values are
                               dictionaries of {category: target_proportion}.
                               Example: {'gender': {'Male': 0.49, 'Female': 0.51}}
         max_iter: Max iterations.
         tolerance: Convergence threshold.
-        
+        trim: Optional (floor, cap) as multiples of the mean weight.
+
     Returns:
         Series of weights.
     """
-    # Initialize weights to 1.0
-    df = df.copy() # Don't modify original
-    df['weight'] = 1.0
-    
-    # Check that targets sum to 1 (approx)
-    for col, targets in target_distributions.items():
-        total = sum(targets.values())
-        if abs(total - 1.0) > 0.01:
-            print(f"Warning: Target proportions for '{col}' sum to {total}, not 1.0. Normalizing.")
-            # Normalize
-            target_distributions[col] = {k: v/total for k,v in targets.items()}
-            
-    for i in range(max_iter):
-        old_weights = df['weight'].copy()
-        
-        # Iterate through each weighting variable
-        for col, targets in target_distributions.items():
-            # Calculate current weighted proportions
-            current_counts = df.groupby(col)['weight'].sum()
-            total_weight = current_counts.sum()
-            
-            # Update weights
-            # New Weight = Old Weight * (Target Prop / Current Prop)
-            for category, target_prop in targets.items():
-                if category in current_counts.index:
-                    current_prop = current_counts[category] / total_weight
-                    if current_prop > 0:
-                        factor = target_prop / current_prop
-                        # Apply factor only to rows with this category
-                        df.loc[df[col] == category, 'weight'] *= factor
-                else:
-                    print(f"Warning: Category '{category}' in targets missing from sample column '{col}'.")
-                    
-        # Check convergence
-        weight_diff = (df['weight'] - old_weights).abs().sum()
-        if weight_diff < tolerance:
-            print(f"Raking converged after {i+1} iterations.")
+    result = rake(df, target_distributions, max_iter=max_iter, tolerance=tolerance, trim=trim)
+    if result.converged:
+        print(f"Raking converged after {result.iterations} iterations.")
+    return result.weights
+
+CALIBRATION_METHODS = ('linear', 'logit', 'raking')
+# Step halvings per Newton iteration before calibration is considered stalled
+CALIBRATION_MAX_HALVINGS = 30
+
+def calibration_matrix(df, categorical_targets=None, numeric_targets=None):
+    """
+    Builds the calibration design matrix and target means.
+
+    The first constraint is always the constant (target mean 1, i.e. the population
+    total). As in `rake`, category proportions apply to the rows observed on that
+    variable: each category contributes indicator - proportion * observed, with target 0.
+
+    Args:
+        df: Pandas DataFrame containing the sample data.
+        categorical_targets: {column: {category: proportion}} or, for joint cells,
+                             {(col_a, col_b): {(cat_a, cat_b): proportion}}.
+        numeric_targets: {column: population mean}. Missing values are set to the
+                         target mean so they do not pull the constraint.
+
+    Returns:
+        (X, means, labels): n x p float matrix, the p target means per unit of total
+        and a label per constraint.
+    """
+    columns, means, labels = [np.ones(len(df))], [1.0], ["total"]
+    for key, targets in normalize_targets(categorical_targets or {}).items():
+        cols = list(key) if isinstance(key, tuple) else [key]
+        codes, uniques = zip(*(pd.factorize(df[c]) for c in cols))
+        observed = np.logical_and.reduce([code >= 0 for code in codes]).astype(float)
+        for category, target_prop in targets.items():
+            cats = category if isinstance(category, tuple) else (category,)
+            positions = [pd.Index(u).get_indexer([cat])[0] for u, cat in zip(uniques, cats)]
+            if min(positions) < 0:
+                print(f"Warning: Category '{category}' in targets missing from sample column '{key}'.")
+                continue
+            indicator = np.ones(len(df), dtype=bool)
+            for code, pos in zip(codes, positions):
+                indicator &= code == pos
+            columns.append(indicator - target_prop * observed)
+            means.append(0.0)
+            labels.append(f"{key}={category}")
+
+    for col, target_mean in (numeric_targets or {}).items():
+        values = pd.to_numeric(df[col], errors='coerce').fillna(target_mean)
+        columns.append(values.to_numpy(dtype=float))
+        means.append(target_mean)
+        labels.append(f"mean({col})")
+
+    X = np.column_stack(columns) if columns else np.empty((len(df), 0))
+    return X, np.asarray(means, dtype=float), labels
+
+def calibration_function(method, bounds=None):
+    """Returns (F, dF) of the calibration distance, with F(0) = dF(0) = 1."""
+    if method == 'linear':
+        return (lambda u: 1.0 + u), (lambda u: np.ones_like(u))
+    if method == 'raking':
+        return (lambda u: np.exp(np.clip(u, -700, 700))), (lambda u: np.exp(np.clip(u, -700, 700)))
+
+    # Deville-Sarndal logit distance: ratios w/d stay strictly inside (L, U).
+    # Written as L + (U - L) * sigmoid(A u + c) so extreme u cannot overflow.
+    L, U = bounds
+    A = (U - L) / ((1 - L) * (U - 1))
+    c = np.log((1 - L) / (U - 1))
+
+    def sigmoid(u):
+        return 1.0 / (1.0 + np.exp(np.clip(-(A * u + c), -700, 700)))
+
+    def F(u):
+        return L + (U - L) * sigmoid(u)
+
+    def dF(u):
+        p = sigmoid(u)
+        return A * (U - L) * p * (1 - p)
+
+    return F, dF
+
+def calibrate(df, categorical_targets=None, numeric_targets=None, method='linear', bounds=(0.3, 3.0),
+              base_weights=None, population_total=None, max_iter=50, tolerance=1e-8):
+    """
+    Generalized regression (GREG) calibration of weights to joint and continuous targets.
+
+    Solves the calibration equations sum_i d_i F(x_i' lambda) x_i = t by Newton's
+    method on the small p x p system X' diag(d F') X, instead of cycling margins.
+    Linear calibration converges in one step; logit and raking in a handful.
+
+    Args:
+        df: Pandas DataFrame containing the sample data.
+        categorical_targets: {column or (col_a, col_b): {category: proportion}}.
+                             Proportions apply to the rows observed on the variable(s), as in `rake`.
+        numeric_targets: {column: population mean}, e.g. {'household_size': 3.1}.
+                         A total constraint is always included, so means are hit exactly.
+        method: 'linear' (GREG, weights may go negative), 'logit' (ratios bounded by
+                `bounds`) or 'raking' (exponential, matches IPF on the same margins when no
+                values are missing).
+        bounds: (L, U) limits on w/d for the logit method, L < 1 < U.
+        base_weights: Optional design weights d (default 1.0).
+        population_total: Scale of the calibrated weights (default sum of base weights).
+        max_iter: Max Newton iterations.
+        tolerance: Convergence threshold on the max constraint error (proportion scale).
+                   Newton steps are halved until that error drops; if no step improves
+                   it (e.g. logit bounds that no weights can meet), calibration stops
+                   with a warning.
+
+    Returns:
+        RakingResult (converged=False when the targets were not met); history tracks
+        the max constraint error per Newton iteration.
+    """
+    if method not in CALIBRATION_METHODS:
+        raise ValueError(f"Unknown calibration method '{method}'. Expected one of {CALIBRATION_METHODS}.")
+    if method == 'logit' and not (bounds[0] < 1 < bounds[1]):
+        raise ValueError(f"Logit bounds must satisfy L < 1 < U, got {bounds}.")
+
+    X, means, labels = calibration_matrix(df, categorical_targets, numeric_targets)
+    d = np.ones(len(df)) if base_weights is None else np.asarray(base_weights, dtype=float)
+    total = d.sum() if population_total is None else float(population_total)
+    d = d * (total / d.sum())
+    t = means * total
+    F, dF = calibration_function(method, bounds)
+
+    lam = np.zeros(X.shape[1])
+    weights = d * F(X @ lam)
+    residual = t - X.T @ weights
+    max_error = np.abs(residual).max(initial=0.0) / total
+    history = [{'iteration': 1, 'max_marginal_error': max_error, 'weight_change': 0.0}]
+    converged = max_error < tolerance
+    while not converged and len(history) < max_iter:
+        # Margins of one variable all sum to the total, so the system is rank-deficient: use lstsq
+        hessian = (X * (d * dF(X @ lam))[:, None]).T @ X
+        step = np.linalg.lstsq(hessian, residual, rcond=None)[0]
+
+        # Halve the Newton step until the max constraint error drops; unreachable
+        # targets (e.g. logit bounds too tight) stall here instead of diverging
+        accepted = False
+        for _ in range(CALIBRATION_MAX_HALVINGS):
+            new_lam = lam + step
+            new_weights = d * F(X @ new_lam)
+            if np.isfinite(new_weights).all():
+                new_residual = t - X.T @ new_weights
+                new_error = np.abs(new_residual).max(initial=0.0) / total
+                if new_error < max_error:
+                    accepted = True
+                    break
+            step = step / 2
+        if not accepted:
             break
-            
-    return df['weight']
+
+        history.append({'iteration': len(history) + 1, 'max_marginal_error': new_error,
+                        'weight_change': np.abs(new_weights - weights).sum()})
+        lam, weights, residual, max_error = new_lam, new_weights, new_residual, new_error
+        converged = max_error < tolerance
+
+    if not converged:
+        if method == 'logit':
+            cause = f"Logit bounds {bounds} cannot be met together with the targets"
+        else:
+            cause = f"{method.capitalize()} calibration did not converge"
+        print(f"Warning: {cause} (max constraint error {max_error:.4f} after {len(history)} iterations). "
+              f"Widen the bounds or relax the targets.")
+
+    final_error = np.abs(X.T @ weights - t) / total
+    return RakingResult(
+        weights=pd.Series(weights, index=df.index, name='weight'),
+        converged=converged,
+        iterations=len(history),
+        history=pd.DataFrame(history, columns=['iteration', 'max_marginal_error', 'weight_change']),
+        design_effect=kish_design_effect(weights) if len(weights) else np.nan,
+        effective_n=weights.sum() ** 2 / np.square(weights).sum() if len(weights) else 0.0,
+        min_weight=weights.min() if len(weights) else np.nan,
+        max_weight=weights.max() if len(weights) else np.nan,
+        margin_errors=dict(zip(labels, final_error)),
+    )
+
+REPLICATE_METHODS = ('bootstrap', 'jackknife')
+
+@dataclass
+class ReplicateWeights:
+    """
+    Re-raked replicate weights as an (n_respondents, n_replicates) float32 matrix.
+
+    Var(theta) = scale * sum_r (theta_r - theta)^2, with `scale` = 1/R for the
+    Rao-Wu bootstrap and (G-1)/G for the delete-a-group jackknife.
+    """
+    weights: np.ndarray
+    method: str
+    scale: float
+    index: pd.Index
+
+    def to_frame(self, prefix='rep_'):
+        """Replicate weights as DataFrame columns rep_1..rep_R."""
+        columns = [f"{prefix}{r + 1}" for r in range(self.weights.shape[1])]
+        return pd.DataFrame(self.weights, index=self.index, columns=columns)
+
+_REPLICATE = {}
+
+def _init_replicate_worker(margins, n_rows, method, groups, settings):
+    _REPLICATE.update(margins=margins, n_rows=n_rows, method=method, groups=groups, settings=settings)
+
+def _replicate_base_weights(replicate, seed):
+    """Perturbed starting weights of one replicate."""
+    n_rows = _REPLICATE['n_rows']
+    if _REPLICATE['method'] == 'bootstrap':
+        # Rao-Wu rescaled bootstrap: n-1 draws with replacement, scaled by n/(n-1)
+        counts = np.random.default_rng(seed).multinomial(n_rows - 1, np.full(n_rows, 1.0 / n_rows))
+        return counts * (n_rows / (n_rows - 1))
+    groups = _REPLICATE['groups']
+    n_groups = groups.max() + 1
+    return np.where(groups == replicate, 0.0, n_groups / (n_groups - 1))
+
+def _rake_replicates(replicates, seeds):
+    max_iter, tolerance, trim = _REPLICATE['settings']
+    block = np.empty((_REPLICATE['n_rows'], len(replicates)), dtype=np.float32)
+    for k, (replicate, seed) in enumerate(zip(replicates, seeds)):
+        weights = _replicate_base_weights(replicate, seed)
+        bounds = trim_bounds(weights, trim)
+        for _ in range(max_iter):
+            old_weights = weights.copy()
+            ipf_sweep(weights, _REPLICATE['margins'], bounds)
+            if np.abs(weights - old_weights).sum() < tolerance:
+                break
+        block[:, k] = weights
+    return block
+
+def replicate_weights(df, target_distributions, n_replicates=200, method='bootstrap', n_jobs=None,
+                      seed=None, max_iter=100, tolerance=0.001, trim=None):
+    """
+    Generates bootstrap or jackknife replicate weights, each re-raked to the targets.
+
+    Args:
+        df: Pandas DataFrame containing the sample data.
+        target_distributions: {column: {category: target_proportion}}, as in `rake_weights`.
+        n_replicates: Bootstrap replicates, or jackknife groups (respondents are
+                      assigned to groups at random; one group dropped per replicate).
+        method: 'bootstrap' (Rao-Wu rescaled) or 'jackknife' (delete-a-group JK1).
+        n_jobs: Worker processes (None or 1 = serial, -1 = all cores).
+        seed: Seed for resampling / group assignment. Results do not depend on n_jobs.
+        max_iter, tolerance, trim: Raking settings, as in `rake`.
+
+    Returns:
+        ReplicateWeights.
+    """
+    if method not in REPLICATE_METHODS:
+        raise ValueError(f"Unknown replicate method '{method}'. Expected one of {REPLICATE_METHODS}.")
+
+    margins = encode_margins(df, normalize_targets(target_distributions))
+    seeds = np.random.SeedSequence(seed).spawn(n_replicates + 1)
+    groups = None
+    if method == 'jackknife':
+        groups = np.random.default_rng(seeds[-1]).permutation(len(df)) % n_replicates
+    initargs = (margins, len(df), method, groups, (max_iter, tolerance, trim))
+
+    n_jobs = os.cpu_count() if n_jobs == -1 else (n_jobs or 1)
+    chunks = [c for c in np.array_split(np.arange(n_replicates), n_jobs * 4) if len(c)]
+    if n_jobs == 1:
+        _init_replicate_worker(*initargs)
+        blocks = [_rake_replicates(c, [seeds[r] for r in c]) for c in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_replicate_worker, initargs=initargs) as pool:
+            blocks = list(pool.map(_rake_replicates, chunks, [[seeds[r] for r in c] for c in chunks]))
+
+    scale = 1.0 / n_replicates if method == 'bootstrap' else (n_replicates - 1) / n_replicates
+    return ReplicateWeights(weights=np.hstack(blocks), method=method, scale=scale, index=df.index)
+
+def replicate_se(values, weights, replicates, denominator=None):
+    """
+    Replicate standard errors of weighted means or ratios, one matrix product per side.
+
+    Estimates are ratios of weighted totals sum(w * y) / sum(w * z): z = 1 gives means,
+    z = a subgroup indicator gives subgroup means or column percentages.
+
+    Args:
+        values: (n,) or (n, k) array-like of y.
+        weights: (n,) full-sample weights (missing weights count as 0).
+        replicates: ReplicateWeights.
+        denominator: Optional (n,) or (n, k) array-like of z (default 1).
+
+    Returns:
+        (estimates, standard_errors), each of shape (k,) (or scalars for 1-D values).
+        Both are NaN for a column whose values contain missing entries.
+    """
+    Y = np.asarray(values, dtype=float)
+    squeeze = Y.ndim == 1
+    Y = Y.reshape(len(Y), -1)
+    Z = np.ones((len(Y), 1)) if denominator is None else np.asarray(denominator, dtype=float).reshape(len(Y), -1)
+    w = np.nan_to_num(np.asarray(weights, dtype=float), nan=0.0)
+    W = replicates.weights
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        estimates = (Y.T @ w) / (Z.T @ w)
+        replicate_estimates = (Y.T @ W) / (Z.T @ W)
+    se = np.sqrt(replicates.scale * np.nansum((replicate_estimates - estimates[:, None]) ** 2, axis=1))
+    # Missing values make the estimate undefined: report NaN rather than a zero SE
+    se = np.where(np.isnan(estimates), np.nan, se)
+    return (estimates[0], se[0]) if squeeze else (estimates, se)